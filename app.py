@@ -1,35 +1,170 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, jsonify
+import re
+import json
+import calendar
+import math
+import mimetypes
+import click
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, send_from_directory, jsonify, abort, make_response, session, Response, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload, make_transient_to_detached, object_session
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
 from datetime import datetime
-import markdown
 from flask_wtf.csrf import CSRFProtect
+from archive import (author_counts, author_total, create_archive_counts, month_counts, month_range,
+                     month_total, rebuild_archive_counts)
+from assets import HASHED_NAME_RE as HASHED_ASSET_RE, AssetError, AssetManifest, build_assets, fetch_vendor, source_urls
+from auth import HasherBusy, IdentityCache, LoginThrottle, PasswordHasher
+from chat_backends import load_chat_backend
+from feeds import ArtifactStore, atom_feed, rss_feed, sitemap, sitemap_index
+from images import can_derive, generate_derivatives
+from database import RoutingSession, configure_engines, production_config
+from drafts import DraftConflict, create_draft_table, delete_draft, get_draft, save_draft
+from metrics import Metrics, current_endpoint, instrument
+from page_cache import PageCache
+from popularity import ViewCounter, register_sql_functions
+from preview import PreviewRenderer
+from revisions import (add_revision, create_revision_table, delete_revisions, diff_segments, get_revision,
+                       latest_revision, list_revisions)
+from search import (create_search_index, drop_search_index, plain_text, rebuild_search_index, search_index_columns,
+                    search_posts)
+from shared_state import StampFile
+from static_site import DEPS_HEADER, ENVIRON_KEY as STATIC_ENVIRON_KEY, DependencyIndex, output_name, render as render_static
+from storage import store_upload
+from post_transfer import (FORMATS as TRANSFER_FORMATS, TransferError, guess_format, jsonl_line,
+                           last_exported_id, markdown_document, markdown_filename, markdown_files,
+                           read_jsonl, read_markdown)
+from tools_catalog import SORT_ORDERS as TOOL_SORT_ORDERS, ToolCatalog
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///blog.db'
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///blog.db')
+# 'production' turns on WAL and the other pragmas in database.py and splits
+# reads and writes over separate pools; DB_POOL_SIZE should match the
+# gunicorn thread count.
+app.config['DATABASE_PROFILE'] = os.environ.get('DATABASE_PROFILE', 'default')
+if app.config['DATABASE_PROFILE'] == 'production':
+    app.config.update(production_config(app.config['SQLALCHEMY_DATABASE_URI'],
+                                        int(os.environ.get('DB_POOL_SIZE', 2))))
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['POSTS_PER_PAGE'] = int(os.environ.get('POSTS_PER_PAGE', 10))
+app.config['TOP_POSTS_COUNT'] = 10
+# Top posts rank views with exponential decay; a view counts half as much
+# after this many days.
+app.config['TOP_POSTS_HALF_LIFE_DAYS'] = float(os.environ.get('TOP_POSTS_HALF_LIFE_DAYS', 7))
+# How often each worker writes its buffered view counts to the database.
+app.config['VIEW_FLUSH_SECONDS'] = float(os.environ.get('VIEW_FLUSH_SECONDS', 10))
+app.config['PAGE_CACHE_ENABLED'] = os.environ.get('PAGE_CACHE_ENABLED', '1') == '1'
+app.config['PAGE_CACHE_PATH'] = os.environ.get('PAGE_CACHE_PATH', os.path.join(app.instance_path, 'page_cache.db'))
+# Public base URL used in feeds and the sitemap, e.g. 'https://blog.example.com'.
+# Without it the URL of the request that triggers a rebuild is used.
+app.config['SITE_URL'] = os.environ.get('SITE_URL')
+app.config['FEED_PATH'] = os.environ.get('FEED_PATH', os.path.join(app.instance_path, 'feeds'))
+app.config['FEED_SIZE'] = 20
+app.config['PREVIEW_CACHE_SIZE'] = 4096
+app.config['SITEMAP_CHUNK_SIZE'] = 10000
+# Directory for the static export of public pages (off when unset); see
+# `flask build-static`. Posts and settings changes re-render what they affect.
+app.config['STATIC_SITE_PATH'] = os.environ.get('STATIC_SITE_PATH')
+app.config['STATIC_SITE_DEPS_PATH'] = os.environ.get('STATIC_SITE_DEPS_PATH', os.path.join(app.instance_path, 'static_site.db'))
+# Internal nginx location that aliases the uploads folder, e.g. '/_uploads/'.
+# When set, uploaded_file only picks the file and nginx streams it.
+app.config['UPLOADS_ACCEL_REDIRECT'] = os.environ.get('UPLOADS_ACCEL_REDIRECT')
+# Front-end sources (assets/) and the hashed bundles built from them by
+# `flask build-assets`.
+app.config['ASSET_SOURCE_PATH'] = os.path.join(app.root_path, 'assets')
+app.config['ASSET_PATH'] = os.path.join(app.static_folder, 'dist')
+app.config['AI_TOOLS_PATH'] = os.environ.get('AI_TOOLS_PATH', os.path.join(app.root_path, 'data', 'ai_tools.json'))
+app.config['AI_TOOLS_PER_PAGE'] = 24
+app.config['CHAT_BACKEND'] = os.environ.get('CHAT_BACKEND', 'echo')
+app.config['CHAT_TOKEN_DELAY'] = float(os.environ.get('CHAT_TOKEN_DELAY', 0.05))
+app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 1))
+app.config['SETTINGS_STAMP_PATH'] = os.environ.get('SETTINGS_STAMP_PATH', os.path.join(app.instance_path, 'settings.stamp'))
+app.config['METRICS_PATH'] = os.environ.get('METRICS_PATH', os.path.join(app.instance_path, 'metrics.db'))
+# When set, /metrics requires 'Authorization: Bearer <token>'.
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+# Log requests slower than this many seconds with their SQL breakdown (off when unset).
+app.config['SLOW_REQUEST_SECONDS'] = float(os.environ['SLOW_REQUEST_SECONDS']) if os.environ.get('SLOW_REQUEST_SECONDS') else None
+# Number of reverse proxies in front of the app whose X-Forwarded-* headers
+# are trusted (1 behind the bundled nginx config).
+app.config['PROXY_COUNT'] = int(os.environ.get('PROXY_COUNT', 0))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))
+# Password checks that may be queued or running at once in each worker.
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 4))
+app.config['LOGIN_THROTTLE_PATH'] = os.environ.get('LOGIN_THROTTLE_PATH', os.path.join(app.instance_path, 'login_throttle.db'))
+app.config['LOGIN_THROTTLE_WINDOW'] = int(os.environ.get('LOGIN_THROTTLE_WINDOW', 300))
+app.config['LOGIN_MAX_FAILURES_PER_IP'] = int(os.environ.get('LOGIN_MAX_FAILURES_PER_IP', 20))
+app.config['LOGIN_MAX_FAILURES_PER_USER'] = int(os.environ.get('LOGIN_MAX_FAILURES_PER_USER', 5))
+app.config['USER_CACHE_TTL'] = float(os.environ.get('USER_CACHE_TTL', 30))
+app.config['USER_STAMP_PATH'] = os.environ.get('USER_STAMP_PATH', os.path.join(app.instance_path, 'users.stamp'))
 
-# Ensure upload directory exists with proper permissions
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.chmod(app.config['UPLOAD_FOLDER'], 0o755)
+if app.config['PROXY_COUNT']:
+    count = app.config['PROXY_COUNT']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=count, x_proto=count, x_host=count)
 
 # Initialize CSRF protection
 csrf = CSRFProtect(app)
 
+metrics = Metrics(app.config['METRICS_PATH'])
+
+# Bump MARKDOWN_RENDER_VERSION whenever the extensions or their options change
+# so `flask render-posts` knows which stored HTML is stale.
+MARKDOWN_EXTENSIONS = ['extra', 'codehilite']
+MARKDOWN_RENDER_VERSION = 1
+
+def render_markdown(text):
+    # Imported on first use: with codehilite it pulls in Pygments, and only
+    # saving a post needs it.
+    import markdown
+    started = time.perf_counter()
+    html = markdown.markdown(text or '', extensions=MARKDOWN_EXTENSIONS)
+    metrics.observe('blog_markdown_render_seconds', current_endpoint(), time.perf_counter() - started)
+    return html
+
+# Editor previews: same output as render_markdown, with the HTML of each
+# paragraph or top-level element cached per worker.
+preview_renderer = PreviewRenderer(MARKDOWN_EXTENSIONS, app.config['PREVIEW_CACHE_SIZE'])
+
 # Add markdown filter
 @app.template_filter('markdown')
 def markdown_filter(text):
-    return markdown.markdown(text, extensions=['extra', 'codehilite'])
+    return render_markdown(text)
+
+db = SQLAlchemy(app, session_options={'class_': RoutingSession})
+if app.config['DATABASE_PROFILE'] == 'production':
+    with app.app_context():
+        configure_engines(db)
+with app.app_context():
+    instrument(app, db.engines.values(), metrics, app.config['SLOW_REQUEST_SECONDS'])
+page_cache = PageCache(app.config['PAGE_CACHE_PATH'])
+with app.app_context():
+    register_sql_functions(db.engine)
+_tool_catalog = None
+_tool_catalog_lock = threading.Lock()
+
+def get_tool_catalog():
+    # Loaded once per process, by prepare_app() when serving (so a bad data
+    # file stops startup) or on first use otherwise.
+    global _tool_catalog
+    with _tool_catalog_lock:
+        if _tool_catalog is None:
+            _tool_catalog = ToolCatalog.load(app.config['AI_TOOLS_PATH'])
+        return _tool_catalog
 
-db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_MAX_PENDING'])
+login_throttle = LoginThrottle(app.config['LOGIN_THROTTLE_PATH'], app.config['LOGIN_THROTTLE_WINDOW'])
+user_cache = IdentityCache(app.config['USER_STAMP_PATH'], app.config['USER_CACHE_TTL'])
 
 # Models
 class User(UserMixin, db.Model):
@@ -44,12 +179,68 @@ class User(UserMixin, db.Model):
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
+@db.event.listens_for(User, 'after_update')
+@db.event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    object_session(target).info['users_changed'] = True
+
+@db.event.listens_for(db.session, 'after_commit')
+def _invalidate_user_cache(session):
+    if session.info.pop('users_changed', False):
+        user_cache.invalidate()
+
+@db.event.listens_for(db.session, 'after_rollback')
+def _forget_user_changes(session):
+    session.info.pop('users_changed', None)
+
 class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    content_html = db.Column(db.Text)
+    search_text = db.Column(db.Text)
+    render_version = db.Column(db.Integer)
+    updated_at = db.Column(db.DateTime)
+
+    # Back the keyset pagination on the front page and the date archives,
+    # and per-author listings in date order.
+    __table_args__ = (
+        db.Index('ix_post_created_at_id', 'created_at', 'id'),
+        db.Index('ix_post_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
+
+    @property
+    def cursor(self):
+        return f'{self.created_at.isoformat()}_{self.id}'
+
+    @staticmethod
+    def parse_cursor(cursor):
+        created_at, _, post_id = cursor.rpartition('_')
+        return datetime.fromisoformat(created_at), int(post_id)
+
+    @staticmethod
+    def canonical_cursor(cursor):
+        created_at, post_id = Post.parse_cursor(cursor)
+        return f'{created_at.isoformat()}_{post_id}'
+
+    def render(self):
+        self.content_html = render_markdown(self.content)
+        self.search_text = plain_text(self.content_html)
+        self.render_version = MARKDOWN_RENDER_VERSION
+
+    @property
+    def last_modified(self):
+        return self.updated_at or self.created_at
+
+    @property
+    def html(self):
+        # Posts saved before pre-rendering existed (or with an older renderer)
+        # fall back to rendering on the fly until `flask render-posts` runs.
+        if self.content_html is None or self.render_version != MARKDOWN_RENDER_VERSION:
+            return render_markdown(self.content)
+        return self.content_html
 
 class Settings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -60,28 +251,398 @@ class Settings(db.Model):
     footer_html = db.Column(db.Text)
     copyright_text = db.Column(db.String(200))
 
+class ImageDerivative(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(200), nullable=False, index=True)
+    width = db.Column(db.Integer, nullable=False)
+    path = db.Column(db.String(200), nullable=False, unique=True)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('source', 'width'),)
+
+class PostStats(db.Model):
+    # Maintained by ViewCounter flushes; see popularity.py for the score.
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    views = db.Column(db.Integer, nullable=False, default=0)
+    score = db.Column(db.Float, nullable=False, index=True)
+
+class ImportCheckpoint(db.Model):
+    # How far `flask import` got through a source, committed with each batch.
+    source = db.Column(db.String(500), primary_key=True)
+    position = db.Column(db.Integer, nullable=False)
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+SettingsSnapshot = namedtuple('SettingsSnapshot', [c.name for c in Settings.__table__.columns])
+
+# (stamp, snapshot) for this worker; replaced wholesale, never mutated.
+_site_settings = None
+settings_stamp = StampFile(app.config['SETTINGS_STAMP_PATH'])
+
+def bump_settings_stamp():
+    # Every worker notices on its next lookup and reloads the Settings row.
+    settings_stamp.bump()
+
+def get_site_settings():
+    global _site_settings
+    stamp = settings_stamp.read()
+    if _site_settings is None or _site_settings[0] != stamp:
+        row = Settings.query.first()
+        snapshot = SettingsSnapshot(*(getattr(row, f) for f in SettingsSnapshot._fields)) if row else None
+        _site_settings = (stamp, snapshot)
+    return _site_settings[1]
+
+@app.context_processor
+def inject_settings():
+    record_dependency('settings')
+    return {'settings': get_site_settings()}
+
+def record_dependency(key):
+    # Only static site renders track what a page was built from. Kept in the
+    # WSGI environ: renders share the renderer's app context, and so its g.
+    if has_request_context() and request.environ.get(STATIC_ENVIRON_KEY):
+        request.environ.setdefault('blog.static_deps', set()).add(key)
+
+@db.event.listens_for(Post, 'load')
+def _post_loaded(post, context):
+    record_dependency(f'post:{post.id}')
+
+@db.event.listens_for(User, 'load')
+def _user_loaded(user, context):
+    record_dependency(f'user:{user.id}')
+
+@app.after_request
+def report_static_dependencies(response):
+    if request.environ.get(STATIC_ENVIRON_KEY):
+        response.headers[DEPS_HEADER] = ' '.join(sorted(request.environ.get('blog.static_deps', ())))
+    return response
+
+def cached_page(**vary_args):
+    """Serve anonymous GETs from the shared page cache.
+
+    Only the query arguments named in ``vary_args`` become part of the cache
+    key, so arbitrary query strings can't fill the cache. Each maps to a
+    function giving the argument's canonical form, so that different
+    spellings of one value share an entry; a value it rejects with
+    ValueError is rendered without the cache. Don't name free text such as
+    a search query.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if (not app.config['PAGE_CACHE_ENABLED'] or request.method != 'GET'
+                    or current_user.is_authenticated or '_flashes' in session
+                    or request.environ.get(STATIC_ENVIRON_KEY)):
+                return view(*args, **kwargs)
+
+            key = request.path
+            try:
+                params = sorted((name, canonical(request.args[name]))
+                                for name, canonical in vary_args.items() if name in request.args)
+            except ValueError:
+                return view(*args, **kwargs)
+            if params:
+                key += '?' + '&'.join(f'{name}={value}' for name, value in params)
+
+            cached = page_cache.get(key)
+            if cached:
+                etag, mimetype, body = cached
+                if etag in request.if_none_match:
+                    response = make_response('', 304)
+                else:
+                    response = make_response(body)
+                    response.mimetype = mimetype
+            else:
+                generation = page_cache.generation()
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                etag = page_cache.set(key, generation, response.get_data(), response.mimetype)
+                if etag in request.if_none_match:
+                    response = make_response('', 304)
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+# Derivatives are generated off the request thread by a small per-process
+# pool, created lazily so each gunicorn worker gets its own after forking.
+_image_pool = None
+_image_pool_pid = None
+_image_pool_lock = threading.Lock()
+# source -> ((width, path), ...) for uploads whose derivatives are recorded
+_derivative_cache = {}
+
+def _get_image_pool():
+    global _image_pool, _image_pool_pid
+    with _image_pool_lock:
+        if _image_pool is None or _image_pool_pid != os.getpid():
+            _image_pool = ThreadPoolExecutor(max_workers=app.config['IMAGE_WORKERS'],
+                                             thread_name_prefix='image-derivatives')
+            _image_pool_pid = os.getpid()
+        return _image_pool
+
+def build_derivatives(source):
+    derivatives = generate_derivatives(app.config['UPLOAD_FOLDER'], source)
+    if not derivatives:
+        return 0
+    with app.app_context():
+        existing = {width for width, in ImageDerivative.query.filter_by(source=source)
+                    .with_entities(ImageDerivative.width)}
+        for width, path, size in derivatives:
+            if width not in existing:
+                db.session.add(ImageDerivative(source=source, width=width, path=path, size=size))
+        db.session.commit()
+    # Cached pages rendered while the pool was busy have no srcset yet.
+    page_cache.invalidate()
+    queue_static_rebuild('uploads')
+    return len(derivatives)
+
+def _build_derivatives_logged(source):
+    try:
+        build_derivatives(source)
+    except Exception:
+        app.logger.exception('Could not build image derivatives for %s', source)
+
+def queue_derivatives(source):
+    if can_derive(source):
+        _get_image_pool().submit(_build_derivatives_logged, source)
+
+def get_derivatives(source):
+    derivatives = _derivative_cache.get(source)
+    if derivatives is None:
+        derivatives = tuple(ImageDerivative.query.filter_by(source=source)
+                            .order_by(ImageDerivative.width)
+                            .with_entities(ImageDerivative.width, ImageDerivative.path))
+        # Don't remember a miss: the pool may still be working on it.
+        if derivatives:
+            if len(_derivative_cache) > 10000:
+                _derivative_cache.clear()
+            _derivative_cache[source] = derivatives
+    return derivatives
+
+@app.template_global()
+def upload_srcset(filename):
+    return ', '.join(f"{url_for('uploaded_file', filename=path)} {width}w"
+                     for width, path in get_derivatives(filename))
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        # Attach a copy to this request's session without a SELECT.
+        return db.session.merge(cached, load=False)
+    user = User.query.get(user_id)
+    if user is not None:
+        # Cache a detached copy: the loaded instance belongs to this session.
+        snapshot = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+        make_transient_to_detached(snapshot)
+        user_cache.set(user_id, snapshot)
+    return user
 
 # Routes
 @app.route('/')
+@cached_page(before=Post.canonical_cursor)
 def index():
-    posts = Post.query.order_by(Post.created_at.desc()).all()
-    top_posts = Post.query.order_by(Post.created_at.desc()).limit(10).all()
-    settings = Settings.query.first()
-    return render_template('index.html', posts=posts, top_posts=top_posts, settings=settings)
+    per_page = app.config['POSTS_PER_PAGE']
+    top_count = app.config['TOP_POSTS_COUNT']
+    cursor = request.args.get('before')
+
+    query = Post.query.options(joinedload(Post.author)).order_by(Post.created_at.desc(), Post.id.desc())
+    if cursor:
+        try:
+            created_at, post_id = Post.parse_cursor(cursor)
+        except ValueError:
+            abort(400)
+        query = query.filter(db.tuple_(Post.created_at, Post.id) < (created_at, post_id))
+
+    record_dependency('post-list')
+    # Fetch one extra row to learn whether an older page exists.
+    posts = query.limit(per_page + 1).all()
+    next_cursor = posts[per_page - 1].cursor if len(posts) > per_page else None
+    posts = posts[:per_page]
+
+    return render_template('index.html', posts=posts, top_posts=get_top_posts(top_count),
+                           cursor=cursor, next_cursor=next_cursor)
+
+def get_top_posts(count):
+    # Walks the score index; no sort over the post table.
+    record_dependency('post-list')
+    top_posts = (db.session.query(Post.id, Post.title)
+                 .join(PostStats, PostStats.post_id == Post.id)
+                 .order_by(PostStats.score.desc())
+                 .limit(count).all())
+    if len(top_posts) < count:
+        # Until enough posts have been viewed, fill up with the newest ones.
+        seen = [post.id for post in top_posts]
+        top_posts += (Post.query.with_entities(Post.id, Post.title)
+                      .filter(Post.id.notin_(seen))
+                      .order_by(Post.created_at.desc(), Post.id.desc())
+                      .limit(count - len(top_posts)).all())
+    # Column rows fire no load event; the sidebar shows these titles.
+    for post_id, title in top_posts:
+        record_dependency(f'post:{post_id}')
+    return top_posts
+
+_top_post_ids = None
+
+def _refresh_top_posts():
+    # Runs after each view flush: the front page shows the top posts sidebar,
+    # so drop its cached pages when the ranking they show has changed. Other
+    # pages don't show it and stay cached.
+    global _top_post_ids
+    with app.app_context():
+        ids = [post_id for post_id, title in get_top_posts(app.config['TOP_POSTS_COUNT'])]
+    if _top_post_ids is not None and ids != _top_post_ids:
+        page_cache.invalidate_path('/')
+        queue_static_rebuild('post-list')
+    _top_post_ids = ids
+
+with app.app_context():
+    view_counter = ViewCounter(db.engine, app.config['TOP_POSTS_HALF_LIFE_DAYS'] * 86400,
+                               app.config['VIEW_FLUSH_SECONDS'], on_flush=_refresh_top_posts,
+                               logger=app.logger)
+
+@app.route('/post/<int:post_id>')
+def post_detail(post_id):
+    # Counted before the page cache so cached views still add up.
+    if not request.environ.get(STATIC_ENVIRON_KEY):
+        view_counter.hit(post_id)
+    return _post_page(post_id)
+
+@cached_page()
+def _post_page(post_id):
+    post = Post.query.options(joinedload(Post.author)).get_or_404(post_id)
+    return render_template('post.html', post=post)
+
+@app.template_global()
+def archive_months():
+    record_dependency('post-list')
+    return month_counts(db.session.connection())
+
+@app.template_filter('month_name')
+def month_name_filter(month):
+    return calendar.month_name[month]
+
+def _archive_page(query, total, **context):
+    # Page numbers are fine here: a month or an author is a bounded slice,
+    # and the total comes from post_count, not COUNT(*).
+    record_dependency('post-list')
+    per_page = app.config['POSTS_PER_PAGE']
+    pages = max(1, math.ceil(total / per_page))
+    page = request.args.get('page', 1, type=int)
+    if not 1 <= page <= pages:
+        abort(404)
+    posts = (query.options(joinedload(Post.author))
+             .order_by(Post.created_at.desc(), Post.id.desc())
+             .offset((page - 1) * per_page).limit(per_page).all())
+    return render_template('archive.html', posts=posts, total=total, page=page, pages=pages, **context)
+
+@app.route('/archive')
+@cached_page()
+def archive():
+    conn = db.session.connection()
+    months = month_counts(conn)
+    years = {}
+    for year, month, count in months:
+        years.setdefault(year, []).append((month, count))
+    return render_template('archive_index.html', years=years, authors=author_counts(conn))
+
+@app.route('/archive/<int:year>/<int:month>')
+@cached_page(page=int)
+def archive_month(year, month):
+    try:
+        start, end = month_range(year, month)
+    except ValueError:
+        abort(404)
+    total = month_total(db.session.connection(), year, month)
+    query = Post.query.filter(Post.created_at >= start, Post.created_at < end)
+    return _archive_page(query, total, heading=f'{calendar.month_name[month]} {year}',
+                         endpoint='archive_month', endpoint_args={'year': year, 'month': month})
+
+@app.route('/author/<username>')
+@cached_page(page=int)
+def archive_author(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    total = author_total(db.session.connection(), user.id)
+    query = Post.query.filter(Post.user_id == user.id)
+    return _archive_page(query, total, heading=f'Posts by {user.username}',
+                         endpoint='archive_author', endpoint_args={'username': user.username})
+
+def _search_page():
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    if page < 1:
+        abort(400)
+    per_page = app.config['POSTS_PER_PAGE']
+    hits = search_posts(db.session.connection(), query, per_page + 1, (page - 1) * per_page) if query else []
+    has_next = len(hits) > per_page
+    hits = hits[:per_page]
+    posts = {post.id: post for post in
+             Post.query.options(joinedload(Post.author)).filter(Post.id.in_([hit[0] for hit in hits]))}
+    results = [(posts[post_id], title, snippet) for post_id, title, snippet in hits if post_id in posts]
+    return query, page, has_next, results
+
+# Not page-cached: every distinct query would add an entry.
+@app.route('/search')
+def search():
+    query, page, has_next, results = _search_page()
+    return render_template('search.html', query=query, page=page, has_next=has_next, results=results)
+
+@app.route('/api/search')
+def api_search():
+    query, page, has_next, results = _search_page()
+    return jsonify({
+        'query': query,
+        'page': page,
+        'has_next': has_next,
+        'results': [{
+            'id': post.id,
+            'url': url_for('post_detail', post_id=post.id),
+            'title': post.title,
+            'title_html': str(title),
+            'snippet_html': str(snippet),
+            'author': post.author.username,
+            'created_at': post.created_at.isoformat(),
+        } for post, title, snippet in results],
+    })
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        username = request.form.get('username')
-        password = request.form.get('password')
+        username = request.form.get('username') or ''
+        password = request.form.get('password') or ''
+        limits = {f'ip:{request.remote_addr}': app.config['LOGIN_MAX_FAILURES_PER_IP'],
+                  f'user:{username}': app.config['LOGIN_MAX_FAILURES_PER_USER']}
+        retry_after = login_throttle.retry_after(limits)
+        if retry_after:
+            flash('Too many failed login attempts. Please try again later.')
+            response = make_response(render_template('login.html'), 429)
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+
         user = User.query.filter_by(username=username).first()
-        
-        if user and user.check_password(password):
+        # Don't hold a pooled connection while the password is checked.
+        db.session.close()
+        try:
+            valid = user is not None and password_hasher.check(user.password_hash, password)
+        except HasherBusy:
+            flash('The server is busy. Please try again in a moment.')
+            response = make_response(render_template('login.html'), 503)
+            response.headers['Retry-After'] = '1'
+            return response
+
+        if valid:
+            login_throttle.reset(f'user:{username}')
+            login_throttle.prune()
             login_user(user)
             return redirect(url_for('index'))
+        login_throttle.record_failure(limits)
         flash('Invalid username or password')
     return render_template('login.html')
 
@@ -98,10 +659,18 @@ def new_post():
         title = request.form.get('title')
         content = request.form.get('content_required')
         post = Post(title=title, content=content, author=current_user)
+        post.render()
         db.session.add(post)
+        db.session.flush()
+        conn = db.session.connection()
+        add_revision(conn, post.id, post.title, post.content, current_user.id, post.created_at)
+        delete_draft(conn, current_user.id, 0)
         db.session.commit()
+        page_cache.invalidate()
+        update_feeds([post.id])
+        queue_static_rebuild('post-list', f'post:{post.id}')
         return redirect(url_for('index'))
-    return render_template('new_post.html')
+    return render_template('new_post.html', draft=get_draft(db.session.connection(), current_user.id, 0))
 
 @app.route('/settings', methods=['GET', 'POST'])
 @login_required
@@ -111,6 +680,7 @@ def settings():
         settings = Settings()
         db.session.add(settings)
         db.session.commit()
+        bump_settings_stamp()
 
     if request.method == 'POST':
         settings.blog_title = request.form.get('blog_title')
@@ -122,49 +692,471 @@ def settings():
         if 'head_image' in request.files:
             file = request.files['head_image']
             if file and file.filename:
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                os.chmod(file_path, 0o644)  # Set proper file permissions
-                settings.head_image = filename
+                settings.head_image = store_upload(file, app.config['UPLOAD_FOLDER'])
+                queue_derivatives(settings.head_image)
 
         db.session.commit()
+        bump_settings_stamp()
+        page_cache.invalidate()
+        update_feeds()
+        queue_static_rebuild('settings', 'uploads')
         flash('Settings updated successfully')
         return redirect(url_for('settings'))
 
     return render_template('settings.html', settings=settings)
 
-@app.route('/uploads/<filename>')
+# Feeds and the sitemap are files rebuilt when posts change and served
+# as-is (or their gzip copy), so a poll is a stat and usually a 304.
+feed_store = ArtifactStore(app.config['FEED_PATH'])
+FEED_MIMETYPES = {
+    'atom.xml': 'application/atom+xml',
+    'rss.xml': 'application/rss+xml',
+    'sitemap.xml': 'application/xml',
+}
+
+def update_feeds(post_ids=(), full=False):
+    """Regenerate the feeds, plus the sitemap parts holding ``post_ids`` (or all of it).
+
+    Links are built from SITE_URL. Without it nothing is written: the
+    request's Host header would end up in files served to every subscriber.
+    """
+    if not app.config['SITE_URL']:
+        return
+    with app.test_request_context(base_url=app.config['SITE_URL']), feed_store.lock():
+        _build_feeds()
+        state = None if full else feed_store.read_state('sitemap.json')
+        if state is None:
+            state = _build_sitemap()
+        else:
+            size = app.config['SITEMAP_CHUNK_SIZE']
+            for number in {post_id // size for post_id in post_ids}:
+                _build_sitemap_chunk(number, state)
+        _build_sitemap_index(state)
+
+def _build_feeds():
+    settings = get_site_settings()
+    title = settings.blog_title if settings else 'My Blog'
+    description = settings.blog_description if settings else ''
+    posts = (Post.query.options(joinedload(Post.author))
+             .order_by(Post.created_at.desc(), Post.id.desc())
+             .limit(app.config['FEED_SIZE']))
+    entries = [{
+        'url': url_for('post_detail', post_id=post.id, _external=True),
+        'title': post.title,
+        'author': post.author.username,
+        'published': post.created_at,
+        'updated': post.last_modified,
+        'html': post.html,
+    } for post in posts]
+    site_url = url_for('index', _external=True)
+    feed_store.write('atom.xml', atom_feed(title, description, site_url,
+                                           url_for('atom_feed_view', _external=True), entries))
+    feed_store.write('rss.xml', rss_feed(title, description, site_url,
+                                         url_for('rss_feed_view', _external=True), entries))
+
+def _sitemap_rows(start=None, stop=None):
+    query = db.select(Post.id, Post.created_at, Post.updated_at).order_by(Post.id)
+    if start is not None:
+        query = query.where(Post.id >= start, Post.id < stop)
+    return db.session.execute(query, execution_options={'yield_per': 1000})
+
+def _write_sitemap_chunk(number, rows, state):
+    feed_store.write(f'sitemap-{number}.xml', sitemap(
+        (url_for('post_detail', post_id=post_id, _external=True), updated_at or created_at)
+        for post_id, created_at, updated_at in rows))
+    lastmod = max(updated_at or created_at for post_id, created_at, updated_at in rows)
+    state[str(number)] = lastmod.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _build_sitemap_chunk(number, state):
+    size = app.config['SITEMAP_CHUNK_SIZE']
+    rows = _sitemap_rows(number * size, (number + 1) * size).all()
+    if rows:
+        _write_sitemap_chunk(number, rows, state)
+    else:
+        feed_store.remove(f'sitemap-{number}.xml')
+        state.pop(str(number), None)
+
+def _build_sitemap():
+    # One pass over the post table, holding a single chunk at a time.
+    size = app.config['SITEMAP_CHUNK_SIZE']
+    state, chunk, number = {}, [], None
+    for row in _sitemap_rows():
+        if row.id // size != number:
+            if chunk:
+                _write_sitemap_chunk(number, chunk, state)
+            chunk, number = [], row.id // size
+        chunk.append(row)
+    if chunk:
+        _write_sitemap_chunk(number, chunk, state)
+    feed_store.write('sitemap-pages.xml', sitemap([
+        (url_for('index', _external=True), None),
+        (url_for('ai_tools', _external=True), None),
+    ]))
+    return state
+
+def _build_sitemap_index(state):
+    feed_store.write_state('sitemap.json', state)
+    parts = [(url_for('sitemap_part', part='pages', _external=True), None)]
+    parts += [(url_for('sitemap_part', part=number, _external=True), state[number])
+              for number in sorted(state, key=int)]
+    feed_store.write('sitemap.xml', sitemap_index(parts))
+
+def send_feed_file(name, mimetype):
+    if not app.config['SITE_URL']:
+        abort(404)
+    if not (feed_store.exists('atom.xml') and feed_store.exists('sitemap.xml')):
+        # First request after a deploy or a bulk change.
+        update_feeds(full=True)
+    if not feed_store.exists(name):
+        abort(404)
+    compressed = 'gzip' in request.accept_encodings
+    response = send_file(feed_store.path(name, compressed), mimetype=mimetype,
+                         conditional=True, max_age=300)
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/feed.atom')
+def atom_feed_view():
+    return send_feed_file('atom.xml', FEED_MIMETYPES['atom.xml'])
+
+@app.route('/feed.rss')
+def rss_feed_view():
+    return send_feed_file('rss.xml', FEED_MIMETYPES['rss.xml'])
+
+@app.route('/sitemap.xml')
+def sitemap_view():
+    return send_feed_file('sitemap.xml', FEED_MIMETYPES['sitemap.xml'])
+
+@app.route('/sitemap-<part>.xml')
+def sitemap_part(part):
+    if part != 'pages' and not part.isdigit():
+        abort(404)
+    return send_feed_file(f'sitemap-{part}.xml', FEED_MIMETYPES['sitemap.xml'])
+
+# Static site export. Every public page is rendered through the app itself
+# (anonymously), recording which rows it read; a change re-renders just
+# the pages that read what changed.
+UPLOADS_MANIFEST = 'uploads-manifest.json'
+_static_pool = None
+_static_pool_pid = None
+_static_pool_lock = threading.Lock()
+_static_deps = None
+
+def _get_static_deps():
+    global _static_deps
+    if _static_deps is None:
+        _static_deps = DependencyIndex(app.config['STATIC_SITE_DEPS_PATH'])
+    return _static_deps
+
+def static_site_pages():
+    ids = db.session.execute(db.select(Post.id).order_by(Post.id), execution_options={'yield_per': 5000})
+    return ['/', url_for('ai_tools')] + [url_for('post_detail', post_id=post_id) for post_id, in ids]
+
+def render_static_pages(paths):
+    """Render ``paths`` into the static directory; returns ``[(path, dependency keys or None)]``."""
+    store = ArtifactStore(app.config['STATIC_SITE_PATH'])
+    client = app.test_client()
+    results = []
+    for path in paths:
+        if path == UPLOADS_MANIFEST:
+            with app.app_context():
+                store.write(UPLOADS_MANIFEST, uploads_manifest())
+            results.append((path, ['uploads']))
+            continue
+        status, body, deps = render_static(client, path)
+        if status == 200:
+            store.write(output_name(path), body)
+            results.append((path, deps))
+        else:
+            store.remove(output_name(path))
+            results.append((path, None))
+    return results
+
+def uploads_manifest():
+    """Every uploaded file with its size and resized copies, as JSON."""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    derivatives = {}
+    for source, width, path in ImageDerivative.query.with_entities(
+            ImageDerivative.source, ImageDerivative.width, ImageDerivative.path):
+        derivatives.setdefault(source, {})[str(width)] = path
+    derived = {path for widths in derivatives.values() for path in widths.values()}
+    files = {}
+    for root, dirs, names in os.walk(upload_folder):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.relpath(os.path.join(root, name), upload_folder).replace(os.sep, '/')
+            if name.startswith('.') or path in derived:
+                continue
+            files[path] = {'size': os.path.getsize(os.path.join(root, name)),
+                           'derivatives': derivatives.get(path, {})}
+    return json.dumps({'files': files}, indent=1, sort_keys=True).encode('utf-8')
+
+def rebuild_static(keys, new_pages=False):
+    """Re-render the exported pages that depend on any of ``keys``.
+
+    ``new_pages`` also renders public pages that aren't exported yet, after
+    a bulk change that added posts.
+    """
+    deps = _get_static_deps()
+    store = ArtifactStore(app.config['STATIC_SITE_PATH'])
+    with store.lock():
+        paths = deps.pages_for(keys)
+        if new_pages:
+            paths.update(set(static_site_pages()) - deps.pages())
+        # A new post has no recorded page yet.
+        paths.update(url_for('post_detail', post_id=int(key[5:])) for key in keys if key.startswith('post:'))
+        if 'uploads' in keys:
+            paths.add(UPLOADS_MANIFEST)
+        deps.update(render_static_pages(sorted(paths)))
+    return len(paths)
+
+def _rebuild_static_logged(keys):
+    try:
+        with app.test_request_context():
+            rebuild_static(keys)
+    except Exception:
+        app.logger.exception('Could not update the static site for %s', ', '.join(keys))
+
+def queue_static_rebuild(*keys):
+    global _static_pool, _static_pool_pid
+    if not app.config['STATIC_SITE_PATH']:
+        return
+    with _static_pool_lock:
+        if _static_pool is None or _static_pool_pid != os.getpid():
+            _static_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='static-site')
+            _static_pool_pid = os.getpid()
+        _static_pool.submit(_rebuild_static_logged, keys)
+
+# Content-addressed names from store_upload() and their derivatives: the
+# bytes behind such a name never change.
+HASHED_UPLOAD_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64}(?:\.w\d+)?)\.[a-z0-9]+$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+def send_upload(path, immutable):
+    folder = app.config['UPLOAD_FOLDER']
+    hashed = HASHED_UPLOAD_RE.match(path)
+    accel_prefix = app.config['UPLOADS_ACCEL_REDIRECT']
+    if accel_prefix:
+        full_path = safe_join(folder, path)
+        if full_path is None or not os.path.isfile(full_path):
+            abort(404)
+        # nginx handles conditional and Range requests for the bytes it sends.
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + path
+        response.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    else:
+        # Werkzeug answers If-None-Match/If-Modified-Since with 304 and Range
+        # with 206, streaming through the server's file wrapper (sendfile).
+        response = send_from_directory(folder, path, etag=hashed.group(1) if hashed else True)
+    if hashed and immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+@app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    # Plain <img src> links (e.g. images inside post content) get the best
+    # WebP derivative when the browser takes WebP: the narrowest one at least
+    # ?w= wide, or the largest one. ?original=1 always serves the upload.
+    # A derivative itself (<hash>.wNNN.webp) is final and served as is.
+    hashed = HASHED_UPLOAD_RE.match(filename)
+    is_derivative = hashed is not None and '.w' in hashed.group(1)
+    if can_derive(filename) and not is_derivative and not request.args.get('original'):
+        derivatives = get_derivatives(filename)
+        if not derivatives:
+            # Derivatives may still be on their way; don't pin this answer.
+            return send_upload(filename, immutable=False)
+        if 'image/webp' in request.headers.get('Accept', ''):
+            wanted = request.args.get('w', type=int)
+            path = next((path for width, path in derivatives if wanted and width >= wanted),
+                        derivatives[-1][1])
+        else:
+            path = filename
+        response = send_upload(path, immutable=True)
+        response.vary.add('Accept')
+        return response
+    return send_upload(filename, immutable=True)
+
+asset_manifest = AssetManifest(app.config['ASSET_PATH'])
+_asset_warned = False
+
+@app.template_global()
+def asset_urls(name):
+    """URLs to load the bundle ``name`` (e.g. 'site.css') from: its built file, named after its content.
+
+    Until `flask build-assets` has run, the bundle's sources one by one, with
+    vendored libraries that aren't in assets/vendor taken from their pinned
+    CDN URLs, so a fresh checkout works without a build or network access.
+    """
+    global _asset_warned
+    built = asset_manifest.resolve(name)
+    if built is not None:
+        return [url_for('asset_file', filename=built)]
+    if not _asset_warned:
+        app.logger.warning('No built asset for %s; run `flask build-assets`', name)
+        _asset_warned = True
+    return [source if '://' in source else url_for('asset_source', filename=source)
+            for source in source_urls(app.config['ASSET_SOURCE_PATH'], name)]
+
+@app.route('/assets/<path:filename>')
+def asset_source(filename):
+    # Unbundled sources, only linked while there is no build.
+    return send_from_directory(app.config['ASSET_SOURCE_PATH'], filename)
+
+@app.route('/static/dist/<filename>')
+def asset_file(filename):
+    # Only hashed names are served from here, and they never change.
+    if not HASHED_ASSET_RE.match(filename):
+        abort(404)
+    folder = app.config['ASSET_PATH']
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if candidate in request.accept_encodings and os.path.isfile(os.path.join(folder, filename + suffix)):
+            encoding = candidate
+            break
+    path = filename + ('.br' if encoding == 'br' else '.gz' if encoding else '')
+    # Each encoding is a different representation and needs its own ETag.
+    etag = f"{filename.rsplit('.', 2)[1]}-{encoding or 'identity'}"
+    response = send_from_directory(folder, path, mimetype=mimetype, etag=etag)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/post/<int:post_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_post(post_id):
     post = Post.query.get_or_404(post_id)
-    if post.author != current_user:
+    if post.user_id != current_user.id:
         flash('You do not have permission to edit this post.')
         return redirect(url_for('index'))
     
     if request.method == 'POST':
+        previous = (post.title, post.content, post.updated_at or post.created_at)
         post.title = request.form.get('title')
         post.content = request.form.get('content_required')
+        post.updated_at = datetime.utcnow()
+        post.render()
+        db.session.flush()
+        record_revision(post, *previous)
+        delete_draft(db.session.connection(), current_user.id, post.id)
         db.session.commit()
+        page_cache.invalidate()
+        update_feeds([post.id])
+        queue_static_rebuild(f'post:{post.id}')
         flash('Post has been updated!')
         return redirect(url_for('index'))
     
-    return render_template('edit_post.html', post=post)
+    return render_template('edit_post.html', post=post,
+                           draft=get_draft(db.session.connection(), current_user.id, post.id))
+
+def record_revision(post, previous_title, previous_content, previous_saved_at):
+    """Add the post's saved title and content to its history, in the current transaction.
+
+    Posts from before revision history (or from `flask import`) get their
+    previous version recorded first, so the edit can be diffed.
+    """
+    # Called after a flush, so this is the writer connection.
+    conn = db.session.connection()
+    if latest_revision(conn, post.id) is None:
+        add_revision(conn, post.id, previous_title, previous_content, post.user_id, previous_saved_at)
+    add_revision(conn, post.id, post.title, post.content, current_user.id, post.updated_at)
+
+@app.route('/preview', methods=['POST'])
+@login_required
+def preview():
+    content = (request.get_json(silent=True) or {}).get('content')
+    if not isinstance(content, str):
+        return {'error': {'message': 'No content'}}, 400
+    return {'html': preview_renderer(content)}
+
+@app.route('/post/new/draft', methods=['POST', 'DELETE'], defaults={'post_id': 0})
+@app.route('/post/<int:post_id>/draft', methods=['POST', 'DELETE'])
+@login_required
+def post_draft(post_id):
+    """Autosave the editor: the full content, or changes to the draft version the browser has.
+
+    POST ``{"version", "title"?, "content"}`` or ``{"version", "title"?,
+    "changes": [[start, end, text], ...], "length"}``; offsets and length
+    are in UTF-16 code units. A 409 means the browser should send the full
+    content again.
+    """
+    if post_id:
+        post = Post.query.get_or_404(post_id)
+        if post.user_id != current_user.id:
+            return {'error': {'message': 'Not your post'}}, 403
+    if request.method == 'DELETE':
+        with db.engine.begin() as conn:
+            delete_draft(conn, current_user.id, post_id)
+        return '', 204
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or ('content' in data) == ('changes' in data):
+        return {'error': {'message': 'Send either content or changes'}}, 400
+    # Give the session's connection back; the draft is written on its own.
+    db.session.close()
+    try:
+        with db.engine.begin() as conn:
+            draft = save_draft(conn, current_user.id, post_id, data.get('version', 0), data.get('title'),
+                               data.get('content'), data.get('changes'), data.get('length'))
+    except DraftConflict as e:
+        return {'error': {'message': 'Draft changed; send the full content'}, 'version': e.version}, 409
+    except ValueError as e:
+        return {'error': {'message': str(e)}}, 400
+    return {'version': draft.version, 'saved_at': draft.updated_at.isoformat()}
+
+@app.route('/post/<int:post_id>/history')
+@login_required
+def post_history(post_id):
+    post = Post.query.get_or_404(post_id)
+    if post.user_id != current_user.id:
+        flash('You do not have permission to view this post\'s history.')
+        return redirect(url_for('index'))
+    revisions = list_revisions(db.session.connection(), post.id)
+    return render_template('post_history.html', post=post, revisions=revisions)
+
+@app.route('/post/<int:post_id>/diff')
+@login_required
+def post_diff(post_id):
+    post = Post.query.get_or_404(post_id)
+    if post.user_id != current_user.id:
+        flash('You do not have permission to view this post\'s history.')
+        return redirect(url_for('index'))
+    conn = db.session.connection()
+    latest = latest_revision(conn, post.id)
+    if latest is None:
+        abort(404)
+    new_number = request.args.get('to', latest, type=int)
+    old_number = request.args.get('from', max(new_number - 1, 1), type=int)
+    old, new = get_revision(conn, post.id, old_number), get_revision(conn, post.id, new_number)
+    if old is None or new is None:
+        abort(404)
+    return render_template('post_diff.html', post=post, old=old, new=new, latest=latest,
+                           segments=diff_segments(old.content, new.content))
 
 @app.route('/post/<int:post_id>/delete', methods=['POST'])
 @login_required
 def delete_post(post_id):
     post = Post.query.get_or_404(post_id)
-    if post.author != current_user:
+    if post.user_id != current_user.id:
         flash('You do not have permission to delete this post.')
         return redirect(url_for('index'))
     
+    PostStats.query.filter_by(post_id=post.id).delete()
+    delete_revisions(db.session.connection(), post.id)
     db.session.delete(post)
     db.session.commit()
+    page_cache.invalidate()
+    update_feeds([post_id])
+    queue_static_rebuild('post-list', f'post:{post_id}')
     flash('Post has been deleted!')
     return redirect(url_for('index'))
 
@@ -179,14 +1171,11 @@ def upload_file():
         return {'error': {'message': 'No file selected'}}, 400
     
     if file:
-        filename = secure_filename(file.filename)
-        # Add timestamp to filename to prevent duplicates
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{timestamp}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
-        os.chmod(file_path, 0o644)  # Set proper file permissions
-        
+        # Stored under its content hash, so re-uploads reuse the same file
+        filename = store_upload(file, app.config['UPLOAD_FOLDER'])
+        queue_derivatives(filename)
+        queue_static_rebuild('uploads')
+
         # Return the URL for the uploaded file
         url = url_for('uploaded_file', filename=filename, _external=True)
         return {
@@ -196,359 +1185,402 @@ def upload_file():
     
     return {'error': {'message': 'File upload failed'}}, 400
 
+_chat_backend = None
+
+def get_chat_backend():
+    global _chat_backend
+    if _chat_backend is None:
+        _chat_backend = load_chat_backend(app.config)
+    return _chat_backend
+
 @app.route('/chat', methods=['GET', 'POST'])
 @login_required
 def chat():
     if request.method == 'POST':
         message = request.form.get('message')
         if message:
-            # Here you would typically integrate with an AI service
-            # For now, we'll just echo the message
-            response = f"Echo: {message}"
-            return jsonify({'response': response})
+            return jsonify({'response': get_chat_backend().reply(message)})
     return render_template('chat.html')
 
+@app.route('/chat/stream', methods=['POST'])
+@login_required
+def chat_stream():
+    message = (request.form.get('message') or '').strip()
+    if not message:
+        return {'error': {'message': 'No message'}}, 400
+    backend = get_chat_backend()
+    # Nothing below touches the database, so give the connection back to
+    # the pool now rather than holding it for the whole generation.
+    db.session.close()
+
+    def events():
+        try:
+            for token in backend.stream(message):
+                yield f'data: {json.dumps({"token": token})}\n\n'
+        except Exception:
+            app.logger.exception('Chat backend failed')
+            yield 'event: error\ndata: {}\n\n'
+            return
+        yield 'event: done\ndata: {}\n\n'
+
+    response = Response(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # let nginx pass events through unbuffered
+    return response
+
 @app.route('/ai-tools')
+@cached_page()
 def ai_tools():
-    tools = [
-        # Language & Writing
-        {
-            'name': 'ChatGPT',
-            'description': 'Advanced language model for conversation and text generation',
-            'url': 'https://chat.openai.com',
-            'category': 'Language',
-            'popularity': 5
-        },
-        {
-            'name': 'Claude',
-            'description': 'Anthropic\'s AI assistant for conversation and analysis',
-            'url': 'https://www.anthropic.com/claude',
-            'category': 'Language',
-            'popularity': 5
-        },
-        {
-            'name': 'Perplexity AI',
-            'description': 'AI-powered search engine with detailed answers and citations',
-            'url': 'https://www.perplexity.ai',
-            'category': 'Language',
-            'popularity': 4
-        },
-        {
-            'name': 'Character.AI',
-            'description': 'Chat with AI characters and historical figures',
-            'url': 'https://character.ai',
-            'category': 'Language',
-            'popularity': 4
-        },
-        {
-            'name': 'Pi by Inflection',
-            'description': 'Personal AI assistant focused on helpful conversations',
-            'url': 'https://pi.ai',
-            'category': 'Language',
-            'popularity': 4
-        },
-        
-        # Image Generation & Editing
-        {
-            'name': 'DALL-E',
-            'description': 'AI image generation from text descriptions',
-            'url': 'https://openai.com/dall-e-2',
-            'category': 'Image',
-            'popularity': 5
-        },
-        {
-            'name': 'Midjourney',
-            'description': 'AI art generation through Discord',
-            'url': 'https://www.midjourney.com',
-            'category': 'Image',
-            'popularity': 5
-        },
-        {
-            'name': 'Stable Diffusion',
-            'description': 'Open-source image generation model',
-            'url': 'https://stability.ai',
-            'category': 'Image',
-            'popularity': 5
-        },
-        {
-            'name': 'Leonardo.ai',
-            'description': 'AI art generation and editing platform',
-            'url': 'https://leonardo.ai',
-            'category': 'Image',
-            'popularity': 4
-        },
-        {
-            'name': 'Canva AI',
-            'description': 'AI-powered design and image editing tools',
-            'url': 'https://www.canva.com/ai',
-            'category': 'Image',
-            'popularity': 4
-        },
-        
-        # Video Creation & Editing
-        {
-            'name': 'RunwayML',
-            'description': 'AI-powered video editing and generation',
-            'url': 'https://runwayml.com',
-            'category': 'Video',
-            'popularity': 5
-        },
-        {
-            'name': 'Synthesia',
-            'description': 'AI video generation with virtual presenters',
-            'url': 'https://www.synthesia.io',
-            'category': 'Video',
-            'popularity': 4
-        },
-        {
-            'name': 'HeyGen',
-            'description': 'AI video generation with talking avatars',
-            'url': 'https://www.heygen.com',
-            'category': 'Video',
-            'popularity': 4
-        },
-        {
-            'name': 'Descript',
-            'description': 'AI-powered audio and video editing',
-            'url': 'https://www.descript.com',
-            'category': 'Video',
-            'popularity': 4
-        },
-        {
-            'name': 'Pictory',
-            'description': 'AI video summarization and editing',
-            'url': 'https://pictory.ai',
-            'category': 'Video',
-            'popularity': 3
-        },
-        
-        # Audio & Music
-        {
-            'name': 'ElevenLabs',
-            'description': 'AI voice cloning and text-to-speech',
-            'url': 'https://elevenlabs.io',
-            'category': 'Audio',
-            'popularity': 5
-        },
-        {
-            'name': 'Murf',
-            'description': 'AI voice generator for text-to-speech',
-            'url': 'https://murf.ai',
-            'category': 'Audio',
-            'popularity': 4
-        },
-        {
-            'name': 'Mubert',
-            'description': 'AI music generation platform',
-            'url': 'https://mubert.com',
-            'category': 'Audio',
-            'popularity': 4
-        },
-        {
-            'name': 'Soundraw',
-            'description': 'AI music generator for content creators',
-            'url': 'https://soundraw.io',
-            'category': 'Audio',
-            'popularity': 3
-        },
-        {
-            'name': 'Voicemod',
-            'description': 'Real-time AI voice changer',
-            'url': 'https://www.voicemod.net',
-            'category': 'Audio',
-            'popularity': 3
-        },
-        
-        # Productivity & Business
-        {
-            'name': 'Notion AI',
-            'description': 'AI writing assistant integrated with Notion',
-            'url': 'https://www.notion.so/product/ai',
-            'category': 'Productivity',
-            'popularity': 5
-        },
-        {
-            'name': 'Tome',
-            'description': 'AI-powered presentation generator',
-            'url': 'https://tome.app',
-            'category': 'Productivity',
-            'popularity': 4
-        },
-        {
-            'name': 'Beautiful.ai',
-            'description': 'AI-powered presentation design tool',
-            'url': 'https://www.beautiful.ai',
-            'category': 'Productivity',
-            'popularity': 4
-        },
-        {
-            'name': 'Otter.ai',
-            'description': 'AI meeting assistant for transcription and notes',
-            'url': 'https://otter.ai',
-            'category': 'Productivity',
-            'popularity': 4
-        },
-        {
-            'name': 'Fireflies.ai',
-            'description': 'AI meeting transcription and analysis',
-            'url': 'https://fireflies.ai',
-            'category': 'Productivity',
-            'popularity': 4
-        },
-        
-        # Development & Coding
-        {
-            'name': 'GitHub Copilot',
-            'description': 'AI pair programmer that helps write better code',
-            'url': 'https://github.com/features/copilot',
-            'category': 'Development',
-            'popularity': 5
-        },
-        {
-            'name': 'Tabnine',
-            'description': 'AI code completion tool',
-            'url': 'https://www.tabnine.com',
-            'category': 'Development',
-            'popularity': 4
-        },
-        {
-            'name': 'Codeium',
-            'description': 'Free AI code completion and chat',
-            'url': 'https://codeium.com',
-            'category': 'Development',
-            'popularity': 4
-        },
-        {
-            'name': 'Cursor',
-            'description': 'AI-first code editor',
-            'url': 'https://cursor.sh',
-            'category': 'Development',
-            'popularity': 4
-        },
-        {
-            'name': 'Replit Ghost',
-            'description': 'AI pair programmer in the browser',
-            'url': 'https://replit.com/ghost',
-            'category': 'Development',
-            'popularity': 3
-        },
-        
-        # Marketing & Content
-        {
-            'name': 'Jasper',
-            'description': 'AI content generation for marketing and business',
-            'url': 'https://www.jasper.ai',
-            'category': 'Marketing',
-            'popularity': 5
-        },
-        {
-            'name': 'Copy.ai',
-            'description': 'AI copywriting tool for marketing content',
-            'url': 'https://www.copy.ai',
-            'category': 'Marketing',
-            'popularity': 4
-        },
-        {
-            'name': 'Grammarly',
-            'description': 'AI writing assistant for grammar and style',
-            'url': 'https://www.grammarly.com',
-            'category': 'Marketing',
-            'popularity': 5
-        },
-        {
-            'name': 'Writesonic',
-            'description': 'AI writing and content generation platform',
-            'url': 'https://writesonic.com',
-            'category': 'Marketing',
-            'popularity': 4
-        },
-        {
-            'name': 'Anyword',
-            'description': 'AI copywriting and optimization platform',
-            'url': 'https://anyword.com',
-            'category': 'Marketing',
-            'popularity': 3
-        },
-        
-        # Research & Analysis
-        {
-            'name': 'Elicit',
-            'description': 'AI research assistant for literature review',
-            'url': 'https://elicit.org',
-            'category': 'Research',
-            'popularity': 4
-        },
-        {
-            'name': 'Consensus',
-            'description': 'AI-powered research and fact-checking',
-            'url': 'https://consensus.app',
-            'category': 'Research',
-            'popularity': 4
-        },
-        {
-            'name': 'Scholarcy',
-            'description': 'AI-powered research paper summarization',
-            'url': 'https://www.scholarcy.com',
-            'category': 'Research',
-            'popularity': 3
-        },
-        {
-            'name': 'Semantic Scholar',
-            'description': 'AI-powered academic search engine',
-            'url': 'https://www.semanticscholar.org',
-            'category': 'Research',
-            'popularity': 4
-        },
-        {
-            'name': 'Scite',
-            'description': 'AI-powered citation analysis',
-            'url': 'https://scite.ai',
-            'category': 'Research',
-            'popularity': 3
-        },
-        
-        # Education & Learning
-        {
-            'name': 'Duolingo Max',
-            'description': 'AI-powered language learning with GPT-4',
-            'url': 'https://www.duolingo.com/max',
-            'category': 'Education',
-            'popularity': 4
-        },
-        {
-            'name': 'Khanmigo',
-            'description': 'AI tutor by Khan Academy',
-            'url': 'https://www.khanacademy.org/khan-labs',
-            'category': 'Education',
-            'popularity': 4
-        },
-        {
-            'name': 'Quizlet AI',
-            'description': 'AI-powered study tools and flashcards',
-            'url': 'https://quizlet.com/ai',
-            'category': 'Education',
-            'popularity': 3
-        },
-        {
-            'name': 'Coursera AI',
-            'description': 'AI-powered learning platform',
-            'url': 'https://www.coursera.org/ai',
-            'category': 'Education',
-            'popularity': 4
-        },
-        {
-            'name': 'Memrise AI',
-            'description': 'AI language learning with native speakers',
-            'url': 'https://www.memrise.com',
-            'category': 'Education',
-            'popularity': 3
-        }
-    ]
-    return render_template('ai_tools.html', tools=tools)
+    per_page = app.config['AI_TOOLS_PER_PAGE']
+    catalog = get_tool_catalog()
+    tools = catalog.query()
+    record_dependency('ai-tools')
+    return render_template('ai_tools.html', tools=tools[:per_page], total=len(tools),
+                           categories=catalog.categories, per_page=per_page)
+
+@app.route('/api/ai-tools')
+def api_ai_tools():
+    category = request.args.get('category')
+    if category == 'all':
+        category = None
+    sort = request.args.get('sort', 'popularity')
+    search = (request.args.get('q') or '').strip().lower() or None
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', app.config['AI_TOOLS_PER_PAGE'], type=int)
+    if sort not in TOOL_SORT_ORDERS or page < 1 or not 1 <= per_page <= 100:
+        abort(400)
+    response = Response(get_tool_catalog().page(category, sort, search, page, per_page),
+                        mimetype='application/json')
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def upgrade_db():
+    # db.create_all() never alters existing tables, so add any model columns
+    # and indexes that an older blog.db is missing.
+    with db.engine.begin() as conn:
+        inspector = db.inspect(conn)
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    conn.exec_driver_sql(
+                        f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                    )
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        if 'search_text' in search_index_columns(conn):
+            create_search_index(conn)
+        else:
+            # First run against an existing blog.db, or one whose index still
+            # holds the raw post markup: index the text of the posts it has.
+            drop_search_index(conn)
+            fill_search_text(conn)
+            rebuild_search_index(conn)
+        create_revision_table(conn)
+        create_draft_table(conn)
+        if inspector.has_table('post_count'):
+            create_archive_counts(conn)
+        else:
+            # Likewise, count the posts that predate the archive table.
+            rebuild_archive_counts(conn)
+
+def fill_search_text(conn):
+    rows = conn.exec_driver_sql('SELECT id, content, content_html FROM post WHERE search_text IS NULL').fetchall()
+    for post_id, content, content_html in rows:
+        text = plain_text(content_html if content_html is not None else render_markdown(content))
+        conn.exec_driver_sql('UPDATE post SET search_text = ? WHERE id = ?', (text, post_id))
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text search index from the post table."""
+    with db.engine.begin() as conn:
+        fill_search_text(conn)
+        rebuild_search_index(conn)
+    page_cache.invalidate()
+    click.echo('Search index rebuilt.')
+
+@app.cli.command('build-derivatives')
+def build_derivatives_command():
+    """Generate missing resized WebP copies of uploaded images."""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    derived = set()
+    for source, path in ImageDerivative.query.with_entities(ImageDerivative.source, ImageDerivative.path):
+        derived.update((source, path))
+    count = 0
+    for root, dirs, files in os.walk(upload_folder):
+        for name in files:
+            source = os.path.relpath(os.path.join(root, name), upload_folder).replace(os.sep, '/')
+            if source in derived or name.startswith('.') or not can_derive(source):
+                continue
+            if build_derivatives(source):
+                count += 1
+    click.echo(f'Built derivatives for {count} image(s).')
+
+@app.cli.command('render-posts')
+@click.option('--all', 'render_all', is_flag=True, help='Re-render every post, not only stale ones.')
+@click.option('--batch-size', default=100, show_default=True)
+def render_posts_command(render_all, batch_size):
+    """Pre-render post Markdown that is missing or from an older renderer."""
+    query = Post.query
+    if not render_all:
+        query = query.filter(db.or_(
+            Post.content_html.is_(None),
+            Post.search_text.is_(None),
+            Post.render_version.is_(None),
+            Post.render_version != MARKDOWN_RENDER_VERSION,
+        ))
+    ids = [post_id for post_id, in query.with_entities(Post.id).order_by(Post.id)]
+    for start in range(0, len(ids), batch_size):
+        for post in Post.query.filter(Post.id.in_(ids[start:start + batch_size])):
+            post.render()
+        db.session.commit()
+        db.session.expunge_all()
+    if ids:
+        page_cache.invalidate()
+        update_feeds(full=True)
+        if app.config['STATIC_SITE_PATH']:
+            with app.test_request_context():
+                rebuild_static([f'post:{post_id}' for post_id in ids])
+    click.echo(f'Rendered {len(ids)} post(s).')
+
+@app.cli.command('import')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--format', 'fmt', type=click.Choice(TRANSFER_FORMATS),
+              help='Defaults to markdown for a directory of .md files, jsonl for a file.')
+@click.option('--author', default='admin', show_default=True, help='Username for posts that name no author.')
+@click.option('--batch-size', default=500, show_default=True)
+@click.option('--restart', is_flag=True, help='Ignore the saved position and import SOURCE from the start.')
+def import_posts_command(source, fmt, author, batch_size, restart):
+    """Bulk-import posts from JSONL or a directory of Markdown files.
+
+    Each batch is inserted and committed together with the position reached
+    in SOURCE, so an interrupted import picks up where it stopped when run
+    again. Authors that don't exist yet are created without a usable password.
+    """
+    fmt = fmt or guess_format(source)
+    key = f'{fmt}:{os.path.abspath(source)}'
+    ImportCheckpoint.__table__.create(db.engine, checkfirst=True)
+    checkpoint = db.session.get(ImportCheckpoint, key)
+    start = checkpoint.position if checkpoint and not restart else 0
+    imported = checkpoint.imported if checkpoint and not restart else 0
+    if start:
+        click.echo(f'Resuming {source} after {imported} imported post(s).')
+    if fmt == 'jsonl':
+        records, total = read_jsonl(source, start), os.path.getsize(source)
+    else:
+        records, total = read_markdown(source, start), len(markdown_files(source))
+
+    author_ids = {}
+    created_authors = 0
+
+    def author_id(username):
+        nonlocal created_authors
+        if username not in author_ids:
+            user_id = db.session.query(User.id).filter_by(username=username).scalar()
+            if user_id is None:
+                # '!' never matches a password hash; set one to enable login.
+                user_id = db.session.execute(User.__table__.insert().values(
+                    username=username, password_hash='!')).inserted_primary_key[0]
+                created_authors += 1
+            author_ids[username] = user_id
+        return author_ids[username]
+
+    rows, position = [], start
+    now = datetime.utcnow()
+    try:
+        with click.progressbar(length=total, label='Importing posts', file=click.get_text_stream('stderr')) as bar:
+            bar.update(start)
+            for next_position, record in records:
+                content_html = render_markdown(record['content'])
+                rows.append({
+                    'title': record['title'],
+                    'content': record['content'],
+                    'content_html': content_html,
+                    'search_text': plain_text(content_html),
+                    'render_version': MARKDOWN_RENDER_VERSION,
+                    'created_at': record['created_at'] or now,
+                    'user_id': author_id(record['author'] or author),
+                })
+                bar.update(next_position - position)
+                position = next_position
+                if len(rows) >= batch_size:
+                    imported += _import_batch(key, rows, position, imported)
+                    rows = []
+            if rows:
+                imported += _import_batch(key, rows, position, imported)
+    except TransferError as error:
+        db.session.rollback()
+        raise click.ClickException(f'{error} (rerun to resume after the last committed batch)')
+    page_cache.invalidate()
+    update_feeds(full=True)
+    if app.config['STATIC_SITE_PATH']:
+        with app.test_request_context():
+            rebuild_static(['post-list'], new_pages=True)
+    click.echo(f'Imported {imported} post(s) from {source}; created {created_authors} author(s).')
+
+def _import_batch(key, rows, position, imported):
+    if rows:
+        db.session.execute(Post.__table__.insert(), rows)
+    db.session.merge(ImportCheckpoint(source=key, position=position, imported=imported + len(rows)))
+    db.session.commit()
+    return len(rows)
+
+@app.cli.command('export')
+@click.argument('destination', type=click.Path())
+@click.option('--format', 'fmt', type=click.Choice(TRANSFER_FORMATS), default='jsonl', show_default=True,
+              help='jsonl writes one file (- for stdout); markdown writes one file per post into a directory.')
+@click.option('--resume', is_flag=True, help='Continue an interrupted export after the last post it wrote.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows fetched from the database at a time.')
+def export_posts_command(destination, fmt, resume, batch_size):
+    """Stream every post, oldest id first, to JSONL or Markdown files."""
+    after_id = last_exported_id(destination, fmt) if resume and destination != '-' else 0
+    query = (db.select(Post.id, Post.title, Post.content, Post.created_at, User.username)
+             .join(User, Post.user_id == User.id)
+             .where(Post.id > after_id)
+             .order_by(Post.id))
+    total = db.session.query(db.func.count(Post.id)).filter(Post.id > after_id).scalar()
+    if after_id:
+        click.echo(f'Resuming after post {after_id}.', err=True)
+
+    if fmt == 'markdown':
+        os.makedirs(destination, exist_ok=True)
+        out = None
+    elif destination == '-':
+        out = click.get_text_stream('stdout')
+    else:
+        out = open(destination, 'a' if after_id else 'w', encoding='utf-8')
+
+    count = 0
+    try:
+        with click.progressbar(length=total, label='Exporting posts', file=click.get_text_stream('stderr')) as bar:
+            # yield_per streams rows in batches instead of loading the table.
+            for row in db.session.execute(query, execution_options={'yield_per': batch_size}):
+                if out is not None:
+                    out.write(jsonl_line(*row))
+                else:
+                    path = os.path.join(destination, markdown_filename(row.id, row.title))
+                    tmp_path = f'{path}.tmp'
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        f.write(markdown_document(*row))
+                    os.replace(tmp_path, path)
+                count += 1
+                bar.update(1)
+    finally:
+        if out is not None and destination != '-':
+            out.close()
+    click.echo(f'Exported {count} post(s).', err=True)
+
+def dispose_engines():
+    """Forget database connections inherited from the parent process.
+
+    Called in every forked child (gunicorn workers with preload_app,
+    build-static's renderers). close=False leaves the parent's connections
+    open for the parent; the child opens its own.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def _render_static_chunk(paths):
+    with app.test_request_context():
+        return render_static_pages(paths)
+
+@app.cli.command('build-static')
+@click.option('--jobs', default=os.cpu_count(), show_default=True, help='Rendering processes.')
+@click.option('--chunk-size', default=200, show_default=True, help='Pages handed to a process at a time.')
+def build_static_command(jobs, chunk_size):
+    """Render every public page into STATIC_SITE_PATH for nginx to serve.
+
+    Unchanged pages keep their files (and mtimes); pages that no longer
+    exist are removed. Afterwards the app re-renders only what a change
+    affects.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    if not app.config['STATIC_SITE_PATH']:
+        raise click.ClickException('Set STATIC_SITE_PATH to the directory to export to.')
+    deps = _get_static_deps()
+    store = ArtifactStore(app.config['STATIC_SITE_PATH'])
+    with store.lock(), app.test_request_context():
+        paths = static_site_pages() + [UPLOADS_MANIFEST]
+        chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+        db.session.remove()
+        started = time.perf_counter()
+        with click.progressbar(length=len(paths), label='Rendering pages') as bar:
+            if jobs > 1:
+                with ProcessPoolExecutor(max_workers=jobs, initializer=dispose_engines) as pool:
+                    for results in pool.map(_render_static_chunk, chunks):
+                        deps.update(results)
+                        bar.update(len(results))
+            else:
+                for chunk in chunks:
+                    deps.update(render_static_pages(chunk))
+                    bar.update(len(chunk))
+        stale = deps.pages() - set(paths)
+        for path in stale:
+            store.remove(output_name(path))
+        deps.update((path, None) for path in stale)
+    click.echo(f'Rendered {len(paths)} page(s) in {time.perf_counter() - started:.1f}s; removed {len(stale)}.')
+
+@app.cli.command('build-assets')
+@click.option('--fetch', is_flag=True, help='Download missing vendored files first.')
+@click.option('--refresh', is_flag=True, help='With --fetch, download every vendored file again.')
+def build_assets_command(fetch, refresh):
+    """Bundle assets/ into content-hashed, precompressed files in static/dist."""
+    source_dir = app.config['ASSET_SOURCE_PATH']
+    try:
+        if fetch:
+            for name in fetch_vendor(source_dir, refresh=refresh):
+                click.echo(f'Fetched vendor/{name}')
+        manifest, written, removed = build_assets(source_dir, app.config['ASSET_PATH'])
+    except AssetError as e:
+        raise click.ClickException(str(e))
+    for name in sorted(manifest):
+        click.echo(f'{name} -> {manifest[name]}')
+    if written:
+        # Cached and exported pages still name the old files, which the build
+        # keeps; re-render them so they pick up the new ones.
+        page_cache.invalidate()
+        if app.config['STATIC_SITE_PATH']:
+            with app.test_request_context():
+                rebuild_static(['page'])
+    click.echo(f'Wrote {len(written)} file(s), removed {len(removed)}.')
+
+_app_prepared = False
+
+def prepare_app():
+    """Prepare the module-level app for serving requests and return it.
+
+    This is not an application factory: routes, models and extensions are
+    registered on the one module-level app at import, and every call
+    returns that same object. The filesystem and data file work a serving
+    process needs happens here, once. gunicorn calls it from
+    gunicorn_config.py, in the master when preload_app is on, so workers
+    are forked with it done and only need dispose_engines().
+    """
+    global _app_prepared
+    if not _app_prepared:
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        os.chmod(app.config['UPLOAD_FOLDER'], 0o755)
+        get_tool_catalog()
+        _app_prepared = True
+    return app
 
 def init_db():
     with app.app_context():
         db.create_all()
+        upgrade_db()
         # Create default admin user if not exists
         if not User.query.filter_by(username='admin').first():
             admin = User(username='admin')
@@ -557,5 +1589,6 @@ def init_db():
             db.session.commit()
 
 if __name__ == '__main__':
+    prepare_app()
     init_db()
     app.run(debug=True) 
\ No newline at end of file
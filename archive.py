@@ -0,0 +1,82 @@
+from datetime import datetime
+
+# Posts per (year, month, author). The triggers update it in the same
+# transaction as every insert, delete and date/author change on post, so
+# archive listings and their page counts never need COUNT(*) over post.
+# created_at is stored as 'YYYY-MM-DD HH:MM:SS[.ffffff]'.
+ARCHIVE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS post_count (
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (year, month, user_id)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_post_count_user_id ON post_count (user_id)",
+    """CREATE TRIGGER IF NOT EXISTS post_count_ai AFTER INSERT ON post BEGIN
+        INSERT INTO post_count (year, month, user_id, count)
+        VALUES (CAST(substr(new.created_at, 1, 4) AS INTEGER), CAST(substr(new.created_at, 6, 2) AS INTEGER), new.user_id, 1)
+        ON CONFLICT (year, month, user_id) DO UPDATE SET count = count + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_count_ad AFTER DELETE ON post BEGIN
+        UPDATE post_count SET count = count - 1
+        WHERE year = CAST(substr(old.created_at, 1, 4) AS INTEGER)
+          AND month = CAST(substr(old.created_at, 6, 2) AS INTEGER) AND user_id = old.user_id;
+        DELETE FROM post_count WHERE count <= 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_count_au AFTER UPDATE OF created_at, user_id ON post BEGIN
+        UPDATE post_count SET count = count - 1
+        WHERE year = CAST(substr(old.created_at, 1, 4) AS INTEGER)
+          AND month = CAST(substr(old.created_at, 6, 2) AS INTEGER) AND user_id = old.user_id;
+        INSERT INTO post_count (year, month, user_id, count)
+        VALUES (CAST(substr(new.created_at, 1, 4) AS INTEGER), CAST(substr(new.created_at, 6, 2) AS INTEGER), new.user_id, 1)
+        ON CONFLICT (year, month, user_id) DO UPDATE SET count = count + 1;
+        DELETE FROM post_count WHERE count <= 0;
+    END""",
+]
+
+
+def create_archive_counts(conn):
+    for statement in ARCHIVE_SCHEMA:
+        conn.exec_driver_sql(statement)
+
+
+def rebuild_archive_counts(conn):
+    create_archive_counts(conn)
+    conn.exec_driver_sql('DELETE FROM post_count')
+    conn.exec_driver_sql(
+        'INSERT INTO post_count (year, month, user_id, count) '
+        'SELECT CAST(substr(created_at, 1, 4) AS INTEGER), CAST(substr(created_at, 6, 2) AS INTEGER), '
+        'user_id, COUNT(*) FROM post GROUP BY 1, 2, 3')
+
+
+def month_range(year, month):
+    """``[start, end)`` datetimes of a calendar month; ValueError if it doesn't exist."""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def month_counts(conn):
+    """``[(year, month, posts)]``, newest month first."""
+    return conn.exec_driver_sql(
+        'SELECT year, month, SUM(count) FROM post_count GROUP BY year, month '
+        'ORDER BY year DESC, month DESC').all()
+
+
+def author_counts(conn):
+    """``[(username, posts)]`` for every author with posts, most prolific first."""
+    return conn.exec_driver_sql(
+        'SELECT u.username, c.posts FROM (SELECT user_id, SUM(count) AS posts FROM post_count GROUP BY user_id) c '
+        'JOIN user u ON u.id = c.user_id ORDER BY c.posts DESC, u.username').all()
+
+
+def month_total(conn, year, month):
+    return conn.exec_driver_sql(
+        'SELECT COALESCE(SUM(count), 0) FROM post_count WHERE year = ? AND month = ?',
+        (year, month)).scalar()
+
+
+def author_total(conn, user_id):
+    return conn.exec_driver_sql(
+        'SELECT COALESCE(SUM(count), 0) FROM post_count WHERE user_id = ?', (user_id,)).scalar()
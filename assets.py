@@ -0,0 +1,266 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import urllib.request
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip copies are written
+    brotli = None
+
+# Third-party files, pinned to a version. `flask build-assets --fetch`
+# downloads the missing ones into assets/vendor/; commit them so building
+# (and serving) never depends on a CDN.
+VENDOR = {
+    'bootstrap/bootstrap.min.css': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'bootstrap/bootstrap.bundle.min.js': 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'bootstrap-icons/bootstrap-icons.css': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.7.2/font/bootstrap-icons.css',
+    'bootstrap-icons/fonts/bootstrap-icons.woff2': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.7.2/font/fonts/bootstrap-icons.woff2',
+    'bootstrap-icons/fonts/bootstrap-icons.woff': 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.7.2/font/fonts/bootstrap-icons.woff',
+    'ckeditor/ckeditor.js': 'https://cdn.ckeditor.com/ckeditor5/27.1.0/classic/ckeditor.js',
+}
+# The sha256 of every vendored file, in `sha256sum` format next to them.
+# The first fetch of a file records its digest; later fetches and builds
+# refuse a file that doesn't match. Commit it along with the files.
+VENDOR_SUMS = 'vendor/SHA256SUMS'
+
+# Bundle name -> source files (relative to assets/), concatenated in order.
+BUNDLES = {
+    'site.css': ['vendor/bootstrap/bootstrap.min.css', 'vendor/bootstrap-icons/bootstrap-icons.css', 'css/site.css'],
+    'site.js': ['vendor/bootstrap/bootstrap.bundle.min.js'],
+    'ai_tools.css': ['css/ai_tools.css'],
+    'ai_tools.js': ['js/ai_tools.js'],
+    'chat.css': ['css/chat.css'],
+    'chat.js': ['js/chat.js'],
+    'editor.js': ['vendor/ckeditor/ckeditor.js', 'js/editor.js'],
+}
+
+MANIFEST = 'manifest.json'
+PREVIOUS_MANIFEST = 'manifest.previous.json'
+# Built files are named '<name>.<first 12 hex digits of sha256>.<ext>'.
+HASHED_NAME_RE = re.compile(r'^[\w.-]+\.[0-9a-f]{12}\.[a-z0-9]+$')
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json')
+CSS_URL_RE = re.compile(r'''url\(\s*(?:"([^"]*)"|'([^']*)'|([^'")\s]+))\s*\)''')
+# Vendor builds point at .map files that aren't shipped.
+SOURCE_MAP_RE = re.compile(rb'/[*/][#@] sourceMappingURL=[^\n]*')
+
+
+class AssetError(Exception):
+    pass
+
+
+def hashed_name(name, data):
+    stem, ext = os.path.splitext(os.path.basename(name))
+    return f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def read_vendor_sums(source_dir):
+    """Return ``{vendor name: sha256 hex digest}`` from VENDOR_SUMS."""
+    sums = {}
+    try:
+        with open(os.path.join(source_dir, *VENDOR_SUMS.split('/'))) as f:
+            for line in f:
+                digest, _, name = line.strip().partition('  ')
+                if name:
+                    sums[name] = digest
+    except FileNotFoundError:
+        pass
+    return sums
+
+
+def _write_vendor_sums(source_dir, sums):
+    path = os.path.join(source_dir, *VENDOR_SUMS.split('/'))
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.writelines(f'{sums[name]}  {name}\n' for name in sorted(sums))
+    os.replace(tmp, path)
+
+
+def fetch_vendor(source_dir, refresh=False):
+    """Download the pinned third-party files that are missing; returns their names.
+
+    A download whose sha256 differs from the one in VENDOR_SUMS raises
+    AssetError and is not written.
+    """
+    sums = read_vendor_sums(source_dir)
+    fetched = []
+    try:
+        for name, url in VENDOR.items():
+            path = os.path.join(source_dir, 'vendor', *name.split('/'))
+            if os.path.exists(path) and not refresh:
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with urllib.request.urlopen(url, timeout=30) as response:
+                data = response.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if sums.setdefault(name, digest) != digest:
+                raise AssetError(f'{url} has sha256 {digest}, but {VENDOR_SUMS} pins {sums[name]} '
+                                 '(remove that line if VENDOR now names another version)')
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            fetched.append(name)
+    finally:
+        # Record what was fetched even if a later download failed.
+        if fetched:
+            _write_vendor_sums(source_dir, sums)
+    return fetched
+
+
+def source_urls(source_dir, name):
+    """Where bundle ``name`` is loaded from before `build-assets` has built it.
+
+    Its sources in order: vendored files missing from assets/vendor as their
+    pinned CDN URLs, the others as paths relative to ``source_dir``.
+    """
+    urls = []
+    for source in BUNDLES[name]:
+        vendor = source[len('vendor/'):] if source.startswith('vendor/') else None
+        if vendor and not os.path.exists(os.path.join(source_dir, *source.split('/'))):
+            urls.append(VENDOR[vendor])
+        else:
+            urls.append(source)
+    return urls
+
+
+def _write(directory, name, data):
+    """Write ``name`` and its compressed copies unless they exist (same name, same bytes)."""
+    path = os.path.join(directory, name)
+    variants = [(path, lambda: data)]
+    if name.endswith(COMPRESSIBLE):
+        # Fixed mtime in the gzip header: the same content compresses identically.
+        variants.append((path + '.gz', lambda: gzip.compress(data, compresslevel=9, mtime=0)))
+        if brotli is not None:
+            variants.append((path + '.br', lambda: brotli.compress(data, quality=11)))
+    written = False
+    # The plain file goes last: once it exists its compressed copies do too.
+    for target, encode in reversed(variants):
+        if os.path.exists(target):
+            continue
+        tmp = f'{target}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(encode())
+        os.replace(tmp, target)
+        written = True
+    return written
+
+
+class _Build:
+    def __init__(self, source_dir, output_dir):
+        self.source_dir = source_dir
+        self.output_dir = output_dir
+        self.vendor_sums = read_vendor_sums(source_dir)
+        self.manifest = {}
+        self.written = []
+
+    def read(self, name):
+        path = os.path.join(self.source_dir, *name.split('/'))
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            hint = ' (run `flask build-assets --fetch`)' if name.startswith('vendor/') else ''
+            raise AssetError(f'Missing asset source {name}{hint}') from None
+        expected = self.vendor_sums.get(name[len('vendor/'):]) if name.startswith('vendor/') else None
+        if expected and hashlib.sha256(data).hexdigest() != expected:
+            raise AssetError(f'{name} does not match its sha256 in {VENDOR_SUMS} '
+                             '(run `flask build-assets --fetch --refresh`)')
+        return data
+
+    def emit(self, name, data):
+        output = hashed_name(name, data)
+        if _write(self.output_dir, output, data):
+            self.written.append(output)
+        self.manifest[name] = output
+        return output
+
+    def rewrite_css(self, name, css):
+        # Files a stylesheet refers to (icon fonts) are emitted under their
+        # own hashed names, next to the bundle, and the url()s point there.
+        base = os.path.dirname(name)
+
+        def replace(match):
+            url = next(group for group in match.groups() if group is not None).strip()
+            if url.startswith(('data:', '#', '/')) or '://' in url:
+                return match.group(0)
+            path, _, suffix = url.partition('#')
+            path = path.split('?')[0]
+            reference = os.path.normpath(os.path.join(base, path)).replace(os.sep, '/')
+            output = self.emit(reference, self.read(reference))
+            return f'url("{output}{"#" + suffix if suffix else ""}")'
+
+        return CSS_URL_RE.sub(replace, css.decode('utf-8')).encode('utf-8')
+
+    def bundle(self, name, sources):
+        parts = []
+        for source in sources:
+            data = SOURCE_MAP_RE.sub(b'', self.read(source))
+            if name.endswith('.css'):
+                data = self.rewrite_css(source, data)
+            parts.append(data.rstrip())
+        # ';' keeps one script's trailing expression from running into the next.
+        separator = b'\n;\n' if name.endswith('.js') else b'\n'
+        return self.emit(name, separator.join(parts) + b'\n')
+
+
+def read_manifest(output_dir, name=MANIFEST):
+    try:
+        with open(os.path.join(output_dir, name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _write_manifest(output_dir, name, manifest):
+    path = os.path.join(output_dir, name)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def build_assets(source_dir, output_dir):
+    """Bundle BUNDLES from ``source_dir`` into content-hashed files in ``output_dir``.
+
+    Returns ``(manifest, written, removed)``. Files of the build before this
+    one are kept, since cached pages may still refer to them; older ones are
+    removed.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    build = _Build(source_dir, output_dir)
+    for name, sources in BUNDLES.items():
+        build.bundle(name, sources)
+    current = read_manifest(output_dir)
+    if current != build.manifest:
+        _write_manifest(output_dir, PREVIOUS_MANIFEST, current)
+        _write_manifest(output_dir, MANIFEST, build.manifest)
+    keep = set(build.manifest.values()) | set(read_manifest(output_dir, PREVIOUS_MANIFEST).values())
+    removed = []
+    for name in sorted(os.listdir(output_dir)):
+        base = re.sub(r'\.(gz|br)$', '', name)
+        if HASHED_NAME_RE.match(base) and base not in keep:
+            os.remove(os.path.join(output_dir, name))
+            removed.append(name)
+    return build.manifest, build.written, removed
+
+
+class AssetManifest:
+    """The current build's hashed file names, re-read when `build-assets` replaces it."""
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST)
+        self._names = ({}, None)
+
+    def resolve(self, name):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        names, loaded = self._names
+        if loaded != mtime:
+            names = read_manifest(os.path.dirname(self.path)) if mtime else {}
+            self._names = (names, mtime)
+        return names.get(name)
@@ -0,0 +1,124 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const categoryButtons = document.querySelectorAll('.btn-group .btn[data-category]');
+    const sortButtons = document.querySelectorAll('.btn-group .btn[data-sort]');
+    const searchInput = document.getElementById('searchInput');
+    const toolsGrid = document.getElementById('toolsGrid');
+    const loadMoreButton = document.getElementById('loadMore');
+    const noResults = document.getElementById('noResults');
+    const perPage = parseInt(toolsGrid.dataset.perPage, 10);
+    const apiUrl = toolsGrid.dataset.apiUrl;
+    const state = { category: 'all', sort: 'popularity', q: '', page: 1 };
+    let searchTimer;
+    let requestId = 0;
+
+    // Filtering, sorting and paging happen on the server; the page only
+    // renders the first batch.
+    async function loadTools(append) {
+        const thisRequest = ++requestId;
+        const params = new URLSearchParams({
+            category: state.category, sort: state.sort, q: state.q,
+            page: state.page, per_page: perPage
+        });
+        const response = await fetch(`${apiUrl}?${params}`);
+        const data = await response.json();
+        if (thisRequest !== requestId) return;  // a newer query superseded this one
+
+        if (!append) toolsGrid.replaceChildren();
+        data.items.forEach(tool => toolsGrid.appendChild(renderCard(tool)));
+        loadMoreButton.hidden = !data.has_next;
+        noResults.hidden = data.total > 0;
+    }
+
+    function renderCard(tool) {
+        const col = document.createElement('div');
+        col.className = 'col tool-card';
+        col.dataset.category = tool.category;
+        col.dataset.popularity = tool.popularity;
+        col.innerHTML = `
+            <div class="card h-100">
+                <div class="card-body">
+                    <div class="d-flex justify-content-between align-items-start mb-2">
+                        <h5 class="card-title mb-0"></h5>
+                        <div class="popularity-stars">
+                            ${'<i class="bi bi-star-fill text-warning"></i>'.repeat(tool.popularity)}${'<i class="bi bi-star text-warning"></i>'.repeat(5 - tool.popularity)}
+                        </div>
+                    </div>
+                    <span class="badge bg-primary mb-2"></span>
+                    <p class="card-text"></p>
+                </div>
+                <div class="card-footer bg-transparent border-top-0">
+                    <div class="d-flex justify-content-between align-items-center">
+                        <a target="_blank" class="btn btn-outline-primary btn-sm tool-link">
+                            <i class="bi bi-box-arrow-up-right"></i> Visit Website
+                        </a>
+                        <button class="btn btn-outline-secondary btn-sm tool-info" data-bs-toggle="modal" data-bs-target="#toolModal">
+                            <i class="bi bi-info-circle"></i>
+                        </button>
+                    </div>
+                </div>
+            </div>`;
+        col.querySelector('.card-title').textContent = tool.name;
+        col.querySelector('.badge').textContent = tool.category;
+        col.querySelector('.card-text').textContent = tool.description;
+        col.querySelector('.tool-link').href = tool.url;
+        return col;
+    }
+
+    function restart() {
+        state.page = 1;
+        loadTools(false);
+    }
+
+    // Category filtering
+    categoryButtons.forEach(button => {
+        button.addEventListener('click', function() {
+            categoryButtons.forEach(btn => btn.classList.remove('active'));
+            this.classList.add('active');
+            state.category = this.dataset.category;
+            restart();
+        });
+    });
+
+    // Sorting
+    sortButtons.forEach(button => {
+        button.addEventListener('click', function() {
+            sortButtons.forEach(btn => btn.classList.remove('active'));
+            this.classList.add('active');
+            state.sort = this.dataset.sort;
+            restart();
+        });
+    });
+
+    // Search functionality
+    searchInput.addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => {
+            state.q = searchInput.value.trim();
+            restart();
+        }, 200);
+    });
+
+    loadMoreButton.addEventListener('click', function() {
+        state.page += 1;
+        loadTools(true);
+    });
+
+    // Tool info modal, filled from the clicked card
+    toolsGrid.addEventListener('click', function(e) {
+        const button = e.target.closest('.tool-info');
+        if (!button) return;
+        const card = button.closest('.tool-card');
+        const popularity = parseInt(card.dataset.popularity, 10);
+        const modal = document.getElementById('toolModal');
+        modal.querySelector('.modal-title').textContent = card.querySelector('.card-title').textContent;
+        const details = modal.querySelector('.tool-details');
+        details.innerHTML = `
+            <p><strong>Category:</strong> <span class="detail-category"></span></p>
+            <p><strong>Description:</strong> <span class="detail-description"></span></p>
+            <p><strong>Popularity:</strong> ${'★'.repeat(popularity)}${'☆'.repeat(5 - popularity)}</p>
+        `;
+        details.querySelector('.detail-category').textContent = card.dataset.category;
+        details.querySelector('.detail-description').textContent = card.querySelector('.card-text').textContent;
+        modal.querySelector('.modal-footer .btn-primary').href = card.querySelector('.tool-link').href;
+    });
+});
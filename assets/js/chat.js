@@ -0,0 +1,86 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const chatForm = document.getElementById('chat-form');
+    const messageInput = document.getElementById('message-input');
+    const chatMessages = document.getElementById('chat-messages');
+    const csrfToken = chatForm.elements.csrf_token.value;
+
+    function addMessage(message, isBot = false) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = `message ${isBot ? 'bot-message' : 'user-message'} mb-3`;
+        
+        const messageContent = document.createElement('div');
+        messageContent.className = 'message-content p-3 rounded';
+        messageContent.style.backgroundColor = isBot ? '#f8f9fa' : '#007bff';
+        messageContent.style.color = isBot ? '#212529' : '#ffffff';
+        messageContent.style.maxWidth = '80%';
+        messageContent.style.marginLeft = isBot ? '0' : 'auto';
+        
+        messageContent.textContent = message;
+        messageDiv.appendChild(messageContent);
+        chatMessages.appendChild(messageDiv);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+        return messageContent;
+    }
+
+    // Parse Server-Sent Events from a fetch() body; EventSource can't POST.
+    async function readEvents(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const raw = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                raw.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                onEvent(event, data ? JSON.parse(data) : {});
+            }
+        }
+    }
+
+    chatForm.addEventListener('submit', async function(e) {
+        e.preventDefault();
+        const message = messageInput.value.trim();
+        if (!message) return;
+
+        // Add user message
+        addMessage(message, false);
+        messageInput.value = '';
+        const reply = addMessage('', true);
+
+        try {
+            const response = await fetch(chatForm.action, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/x-www-form-urlencoded',
+                    'X-CSRF-TOKEN': csrfToken
+                },
+                body: new URLSearchParams({
+                    'message': message,
+                    'csrf_token': csrfToken
+                })
+            });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+            // Append the bot response token by token as it streams in
+            await readEvents(response, (event, data) => {
+                if (event === 'error') throw new Error('backend error');
+                if (data.token) {
+                    reply.textContent += data.token;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                }
+            });
+        } catch (error) {
+            console.error('Error:', error);
+            reply.textContent = 'Sorry, there was an error processing your message.';
+        }
+    });
+});
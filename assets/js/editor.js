@@ -0,0 +1,185 @@
+const postForm = document.getElementById('postForm');
+let editor;
+ClassicEditor
+    .create(document.querySelector('#content'), {
+        toolbar: {
+            items: [
+                'heading',
+                '|',
+                'bold',
+                'italic',
+                'link',
+                'bulletedList',
+                'numberedList',
+                '|',
+                'outdent',
+                'indent',
+                '|',
+                'imageUpload',
+                'blockQuote',
+                'insertTable',
+                'undo',
+                'redo'
+            ]
+        },
+        image: {
+            toolbar: [
+                'imageTextAlternative',
+                'imageStyle:inline',
+                'imageStyle:block',
+                'imageStyle:side'
+            ]
+        },
+        table: {
+            contentToolbar: [
+                'tableColumn',
+                'tableRow',
+                'mergeTableCells'
+            ]
+        },
+        simpleUpload: {
+            uploadUrl: postForm.dataset.uploadUrl,
+            headers: {
+                'X-CSRF-TOKEN': postForm.elements.csrf_token.value
+            }
+        }
+    })
+    .then(newEditor => {
+        editor = newEditor;
+        editor.model.document.on('change:data', onChange);
+    })
+    .catch(error => {
+        console.error(error);
+    });
+
+const csrfToken = postForm.elements.csrf_token.value;
+const titleInput = postForm.elements.title;
+const previewPane = document.getElementById('preview');
+const previewButton = document.getElementById('togglePreview');
+const draftStatus = document.getElementById('draftStatus');
+let draftNotice = document.getElementById('draftNotice');
+const AUTOSAVE_INTERVAL = 5000;
+const PREVIEW_DELAY = 300;
+
+function postJSON(url, body) {
+    return fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRF-TOKEN': csrfToken
+        },
+        body: JSON.stringify(body)
+    });
+}
+
+function onChange() {
+    dirty = true;
+    if (!previewPane.hidden) {
+        clearTimeout(previewTimer);
+        previewTimer = setTimeout(refreshPreview, PREVIEW_DELAY);
+    }
+}
+
+// The server renders the preview, so it matches the published post exactly.
+let previewTimer;
+let previewRequest = 0;
+async function refreshPreview() {
+    const request = ++previewRequest;
+    try {
+        const response = await postJSON(postForm.dataset.previewUrl, { content: editor.getData() });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const data = await response.json();
+        // Responses can arrive out of order; only the latest one is shown.
+        if (request === previewRequest) previewPane.innerHTML = data.html;
+    } catch (error) {
+        console.error('Preview failed:', error);
+    }
+}
+
+previewButton.addEventListener('click', function() {
+    previewPane.hidden = !previewPane.hidden;
+    previewButton.classList.toggle('active', !previewPane.hidden);
+    if (!previewPane.hidden) refreshPreview();
+});
+
+// Autosave. After the first save only the span that changed since the last
+// one is sent: [start, end, text] in the JavaScript (UTF-16) indexes the
+// server counts in.
+let saved = null;  // { version, title, content } as the server has it
+let dirty = false;
+let saving = false;
+let submitted = false;
+
+function isHighSurrogate(code) { return code >= 0xD800 && code <= 0xDBFF; }
+function isLowSurrogate(code) { return code >= 0xDC00 && code <= 0xDFFF; }
+
+function changedSpan(before, after) {
+    const limit = Math.min(before.length, after.length);
+    let start = 0;
+    while (start < limit && before[start] === after[start]) start++;
+    if (start > 0 && isHighSurrogate(before.charCodeAt(start - 1))) start--;
+    let tail = 0;
+    while (tail < limit - start && before[before.length - 1 - tail] === after[after.length - 1 - tail]) tail++;
+    if (tail > 0 && isLowSurrogate(before.charCodeAt(before.length - tail))) tail--;
+    return [start, before.length - tail, after.slice(start, after.length - tail)];
+}
+
+async function saveDraft() {
+    if (!dirty || saving || submitted || draftNotice) return;
+    dirty = false;
+    saving = true;
+    const content = editor.getData();
+    const title = titleInput.value;
+    const full = { title: title, content: content };
+    const body = saved
+        ? { version: saved.version, changes: [changedSpan(saved.content, content)], length: content.length }
+        : full;
+    if (saved && title !== saved.title) body.title = title;
+    try {
+        let response = await postJSON(postForm.dataset.draftUrl, body);
+        if (response.status === 409) {
+            // Saved from another tab, or lost: start over with the whole text.
+            response = await postJSON(postForm.dataset.draftUrl, full);
+        }
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const data = await response.json();
+        saved = { version: data.version, title: title, content: content };
+        draftStatus.textContent = `Draft saved at ${new Date().toLocaleTimeString()}`;
+    } catch (error) {
+        dirty = true;
+        draftStatus.textContent = 'Draft not saved';
+        console.error('Autosave failed:', error);
+    } finally {
+        saving = false;
+    }
+}
+
+titleInput.addEventListener('input', function() {
+    dirty = true;
+});
+setInterval(saveDraft, AUTOSAVE_INTERVAL);
+
+if (draftNotice) {
+    // Autosave waits until the earlier draft is restored or discarded, so
+    // it isn't overwritten by accident.
+    draftStatus.textContent = 'Restore or discard the saved draft to turn on autosave';
+    document.getElementById('restoreDraft').addEventListener('click', function() {
+        editor.setData(document.getElementById('draftContent').value);
+        titleInput.value = document.getElementById('draftTitle').value;
+        draftNotice.remove();
+        draftNotice = null;
+        draftStatus.textContent = '';
+    });
+    document.getElementById('discardDraft').addEventListener('click', async function() {
+        await fetch(postForm.dataset.draftUrl, { method: 'DELETE', headers: { 'X-CSRF-TOKEN': csrfToken } });
+        draftNotice.remove();
+        draftNotice = null;
+        draftStatus.textContent = '';
+    });
+}
+
+postForm.addEventListener('submit', function(e) {
+    const content = editor.getData();
+    document.getElementById('content_required').value = content;
+    submitted = true;
+});
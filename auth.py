@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash
+
+from shared_state import SharedSQLite, StampFile
+
+
+class HasherBusy(Exception):
+    """Raised when the password hashing pool cannot take or finish another check."""
+
+
+class PasswordHasher:
+    """Verifies password hashes in a small pool of helper processes.
+
+    Password hashes are deliberately slow to compute; checking one on a
+    request thread would keep that thread busy for the whole check. At most
+    ``max_pending`` checks may be queued or running per worker process;
+    beyond that ``check()`` raises HasherBusy straight away instead of
+    letting a login burst tie up every request thread.
+    """
+
+    def __init__(self, max_workers=1, max_pending=4, timeout=10.0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def _get_pool(self):
+        # Created lazily, and again after gunicorn forks a worker. The helpers
+        # come from a fork server, not from forking a threaded worker.
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context(method))
+                self._pid = os.getpid()
+            return self._pool
+
+    def _discard_pool(self, pool):
+        # A helper died (e.g. OOM-killed) and the executor refuses all further
+        # work; drop it so the next check starts a fresh one.
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def check(self, password_hash, password):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            pool = self._get_pool()
+            try:
+                future = pool.submit(check_password_hash, password_hash, password)
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise HasherBusy()
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                raise HasherBusy()
+        finally:
+            self._slots.release()
+
+
+class LoginThrottle(SharedSQLite):
+    """Failed-login counters shared by every worker process through one SQLite file.
+
+    Counters are kept per key (e.g. ``ip:203.0.113.7`` or ``user:admin``) in
+    fixed windows of ``window`` seconds.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS login_failures ('
+        'key TEXT PRIMARY KEY, count INTEGER NOT NULL, window_start REAL NOT NULL)',
+    )
+
+    def __init__(self, path, window=300):
+        self.window = window
+        super().__init__(path)
+
+    def retry_after(self, limits):
+        """Seconds until any key in ``limits`` ({key: max failures}) may try again; 0 if none is blocked."""
+        now = time.time()
+        placeholders = ', '.join('?' * len(limits))
+        wait = 0
+        for key, count, window_start in self._connect().execute(
+                f'SELECT key, count, window_start FROM login_failures WHERE key IN ({placeholders})',
+                tuple(limits)):
+            if count >= limits[key] and now - window_start < self.window:
+                wait = max(wait, window_start + self.window - now)
+        return int(wait) + 1 if wait else 0
+
+    def record_failure(self, keys):
+        now = time.time()
+        self._connect().executemany(
+            'INSERT INTO login_failures (key, count, window_start) VALUES (?, 1, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'count = CASE WHEN excluded.window_start - window_start >= ? THEN 1 ELSE count + 1 END, '
+            'window_start = CASE WHEN excluded.window_start - window_start >= ? '
+            'THEN excluded.window_start ELSE window_start END',
+            [(key, now, self.window, self.window) for key in keys])
+
+    def reset(self, key):
+        self._connect().execute('DELETE FROM login_failures WHERE key = ?', (key,))
+
+    def prune(self):
+        self._connect().execute('DELETE FROM login_failures WHERE window_start < ?',
+                                (time.time() - self.window,))
+
+
+class IdentityCache:
+    """Short-lived per-process cache of loaded users for Flask-Login.
+
+    Entries expire after ``ttl`` seconds. ``invalidate()`` drops them in
+    this process and replaces the stamp file, which every other worker
+    notices on its next lookup and then clears its own entries.
+    """
+
+    def __init__(self, stamp_path, ttl=30.0):
+        self.stamp_file = StampFile(stamp_path)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stamp = self.stamp_file.read()
+
+    def get(self, key):
+        stamp = self.stamp_file.read()
+        now = time.monotonic()
+        with self._lock:
+            if stamp != self._stamp:
+                self._entries.clear()
+                self._stamp = stamp
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                return None
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._entries) > 10000:
+                self._entries.clear()
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+        self.stamp_file.bump()
+        with self._lock:
+            self._stamp = self.stamp_file.read()
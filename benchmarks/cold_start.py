@@ -0,0 +1,253 @@
+"""Measure how fast the app starts and how much memory its workers hold.
+
+    python benchmarks/cold_start.py -o after.json
+    python benchmarks/cold_start.py --app app:app --no-preload -o before.json
+    python benchmarks/cold_start.py --compare before.json
+
+First the app is imported and built (``--app``, gunicorn's ``module:callable``
+syntax) in --runs fresh interpreters. Then a local gunicorn is started with
+gunicorn_config.py's settings and the report records: time to the first
+response, time until every worker has loaded the app, time for a
+replacement worker to come up after one is killed, and RSS, PSS and USS
+(private memory) of the master and each worker after --warmup requests.
+Without --database a fresh database is seeded at --scale. With --compare,
+metrics that grew by more than --tolerance are listed and the exit status
+is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import runpy
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.run import _child_pids, _free_port, _git_revision, prepare_environment  # noqa: E402
+
+# Peak RSS comes from VmHWM: ru_maxrss would count the benchmark process
+# the child was forked from.
+IMPORT_SCRIPT = '''
+import importlib, re, sys, time
+started = time.perf_counter()
+module, _, expression = sys.argv[1].partition(':')
+eval(expression or 'app', vars(importlib.import_module(module)))
+elapsed = time.perf_counter() - started
+with open('/proc/self/status') as f:
+    print(elapsed, re.search(r'VmHWM:\\s+(\\d+)', f.read()).group(1))
+'''
+
+# Runs gunicorn_config.py, then overrides what the benchmark controls and
+# notes when each worker has loaded the app.
+CONFIG_TEMPLATE = '''
+import runpy, time
+globals().update({{name: value for name, value in runpy.run_path({config!r}).items()
+                  if not name.startswith('__')}})
+bind = {bind!r}
+preload_app = {preload!r}
+daemon = False
+pidfile = None
+accesslog = None
+errorlog = '-'
+loglevel = 'warning'
+capture_output = False
+
+def post_worker_init(worker):
+    with open({marks!r}, 'a') as f:
+        f.write(f'{{worker.pid}} {{time.time()}}\\n')
+'''
+
+WARMUP_PATHS = ['/', '/post/1', '/ai-tools', '/archive', '/feed.atom', '/login']
+
+
+def measure_import(app_spec, runs):
+    times, max_rss = [], []
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT, app_spec], env=env, text=True)
+        seconds, rss = output.split()[-2:]
+        times.append(float(seconds))
+        max_rss.append(int(rss))
+    return {
+        'median_s': round(statistics.median(times), 4),
+        'min_s': round(min(times), 4),
+        'max_rss_kb': int(statistics.median(max_rss)),
+    }
+
+
+def _memory_kb(pid):
+    """RSS, PSS and USS of a process from /proc, in kB."""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                match = re.match(r'(\w+):\s+(\d+) kB', line)
+                if match:
+                    fields[match.group(1)] = int(match.group(2))
+    except OSError:
+        return None
+    return {
+        'rss_kb': fields.get('Rss'),
+        'pss_kb': fields.get('Pss'),
+        'uss_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def _read_marks(path):
+    try:
+        with open(path) as f:
+            return [(int(pid), float(when)) for pid, when in (line.split() for line in f if line.strip())]
+    except FileNotFoundError:
+        return []
+
+
+def _wait_for(condition, timeout, what):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.01)
+    raise RuntimeError(f'timed out waiting for {what}')
+
+
+def measure_gunicorn(args, workdir):
+    config = runpy.run_path(os.path.join(ROOT, 'gunicorn_config.py'))
+    port = _free_port()
+    marks = os.path.join(workdir, 'workers.log')
+    config_path = os.path.join(workdir, 'gunicorn_bench.py')
+    with open(config_path, 'w') as f:
+        f.write(CONFIG_TEMPLATE.format(config=os.path.join(ROOT, 'gunicorn_config.py'),
+                                       bind=f'127.0.0.1:{port}', preload=args.preload, marks=marks))
+    base_url = f'http://127.0.0.1:{port}'
+    command = [sys.executable, '-m', 'gunicorn', '--pythonpath', ROOT, '--chdir', workdir,
+               '-c', config_path, args.app]
+    started = time.time()
+    server = subprocess.Popen(command)
+    try:
+        def respond():
+            try:
+                urllib.request.urlopen(base_url + '/login', timeout=1).read()
+                return time.time()
+            except OSError:
+                return None
+
+        first_response = _wait_for(respond, 60, 'the first response')
+        workers = config['workers']
+        ready = _wait_for(lambda: len(_read_marks(marks)) >= workers and _read_marks(marks), 60,
+                          'every worker to boot')
+        workers_ready = max(when for pid, when in ready)
+
+        for i in range(args.warmup):
+            try:
+                urllib.request.urlopen(base_url + WARMUP_PATHS[i % len(WARMUP_PATHS)], timeout=10).read()
+            except OSError:
+                pass
+        master = _memory_kb(server.pid)
+        worker_memory = [memory for memory in map(_memory_kb, _child_pids(server.pid)) if memory]
+
+        # A worker respawn (crash, max_requests, timeout) pays the boot cost again.
+        victim = _child_pids(server.pid)[0]
+        killed = time.time()
+        os.kill(victim, signal.SIGKILL)
+        booted = _wait_for(lambda: [when for pid, when in _read_marks(marks) if when > killed], 60,
+                           'a replacement worker')
+        return {
+            'workers': workers,
+            'first_response_s': round(first_response - started, 3),
+            'workers_ready_s': round(workers_ready - started, 3),
+            'respawn_s': round(min(booted) - killed, 3),
+            'master': master,
+            'worker_memory': worker_memory,
+            'worker_rss_kb_mean': int(statistics.mean(m['rss_kb'] for m in worker_memory)),
+            'worker_uss_kb_mean': int(statistics.mean(m['uss_kb'] for m in worker_memory)),
+            'total_pss_kb': (master or {}).get('pss_kb', 0) + sum(m['pss_kb'] for m in worker_memory),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+# Metrics compared against a baseline; all of them are better when lower.
+COMPARED = [
+    ('import', 'median_s'), ('import', 'max_rss_kb'),
+    ('server', 'workers_ready_s'), ('server', 'respawn_s'),
+    ('server', 'worker_uss_kb_mean'), ('server', 'total_pss_kb'),
+]
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for section, name in COMPARED:
+        before = baseline.get(section, {}).get(name)
+        after = report[section].get(name)
+        if before and after is not None:
+            print(f'{section}.{name}: {before} -> {after} ({(after - before) / before:+.0%})', file=sys.stderr)
+            if after > before * (1 + tolerance):
+                regressions.append(f'{section}.{name}: {before} -> {after}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--app', default='app:prepare_app()', help='gunicorn app spec (module:callable)')
+    parser.add_argument('--preload', action=argparse.BooleanOptionalAction, default=True,
+                        help='load the app in the gunicorn master before forking workers')
+    parser.add_argument('--scale', choices=('1k', '100k', '1m'), default='1k',
+                        help='size of the seeded database when --database is not given')
+    parser.add_argument('--database', help='existing SQLite database to use (see benchmarks/seed.py)')
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters to time the import in')
+    parser.add_argument('--warmup', type=int, default=60, help='requests served before measuring memory')
+    parser.add_argument('-o', '--output', help='write the JSON report here')
+    parser.add_argument('--compare', help='baseline report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='blog-cold-start-')
+    try:
+        prepare_environment(args, workdir)
+        os.chdir(workdir)
+        imported = measure_import(args.app, args.runs)
+        server = measure_gunicorn(args, workdir)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'app': args.app,
+        'preload': args.preload,
+        'database': args.database or f'seeded:{args.scale}',
+        'import': imported,
+        'server': server,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Compare database profiles under a mixed read/write load.
+
+    python benchmarks/db_concurrency_benchmark.py --workers 4 --threads 2
+
+Mirrors the gunicorn layout: each worker process imports the app with the
+profile under test and runs several threads. Each thread sends front-page
+GETs and, for a share of requests, creates a post through the real routes.
+Errors (mostly "database is locked") and throughput are reported per
+profile.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker(profile, db_path, duration, threads, write_ratio, results):
+    os.environ.update({
+        'DATABASE_URL': f'sqlite:///{db_path}',
+        'DATABASE_PROFILE': profile,
+        'DB_POOL_SIZE': str(threads),
+        'PAGE_CACHE_ENABLED': '0',
+        'PAGE_CACHE_PATH': os.path.join(os.path.dirname(db_path), 'page_cache.db'),
+    })
+    sys.path.insert(0, ROOT)
+    os.chdir(os.path.dirname(db_path))
+    import app as blog
+
+    blog.app.config['WTF_CSRF_ENABLED'] = False
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def run_thread(seed):
+        rng = random.Random(seed)
+        client = blog.app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'admin'})
+        local = {'reads': 0, 'writes': 0, 'errors': 0}
+        while time.monotonic() < deadline:
+            if rng.random() < write_ratio:
+                response = client.post('/post/new', data={
+                    'title': f'Post {rng.random()}',
+                    'content_required': 'Some *markdown* text.\n\n' * 20,
+                })
+                kind = 'writes'
+            else:
+                response = client.get('/')
+                kind = 'reads'
+            if response.status_code >= 500 or '/login' in response.headers.get('Location', ''):
+                local['errors'] += 1
+            else:
+                local[kind] += 1
+        with lock:
+            for key, value in local.items():
+                counts[key] += value
+
+    workers = [threading.Thread(target=run_thread, args=(os.getpid() * 100 + i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    results.put(counts)
+
+
+def prepare_database(db_path):
+    os.environ.update({'DATABASE_URL': f'sqlite:///{db_path}',
+                       'PAGE_CACHE_PATH': os.path.join(os.path.dirname(db_path), 'page_cache.db')})
+    sys.path.insert(0, ROOT)
+    os.chdir(os.path.dirname(db_path))
+    import app as blog
+    blog.init_db()
+    with blog.app.app_context():
+        admin = blog.User.query.filter_by(username='admin').first()
+        for i in range(200):
+            post = blog.Post(title=f'Seed {i}', content='Seed *post* body.\n' * 20, author=admin)
+            post.render()
+            blog.db.session.add(post)
+        blog.db.session.commit()
+
+
+def run_profile(profile, args):
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'blog.db')
+        setup = ctx.Process(target=prepare_database, args=(db_path,))
+        setup.start()
+        setup.join()
+
+        results = ctx.Queue()
+        procs = [ctx.Process(target=run_worker,
+                             args=(profile, db_path, args.duration, args.threads, args.write_ratio, results))
+                 for _ in range(args.workers)]
+        for proc in procs:
+            proc.start()
+        totals = {'reads': 0, 'writes': 0, 'errors': 0}
+        for _ in procs:
+            for key, value in results.get().items():
+                totals[key] += value
+        for proc in procs:
+            proc.join()
+
+    totals['profile'] = profile
+    totals['requests_per_second'] = round((totals['reads'] + totals['writes']) / args.duration, 1)
+    totals['writes_per_second'] = round(totals['writes'] / args.duration, 1)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per profile')
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--profiles', nargs='+', default=['default', 'production'])
+    args = parser.parse_args()
+
+    for profile in args.profiles:
+        print(json.dumps(run_profile(profile, args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Measure editor preview latency and autosave request size on a long post.
+
+    python benchmarks/preview_benchmark.py --size 50000 --keystrokes 500
+
+Builds a post of about --size characters, as editor HTML and as Markdown,
+then types into it one character at a time, moving the cursor now and then.
+After every keystroke the post is rendered whole, as saving does, and by
+the preview renderer, which only renders pieces it hasn't cached; the two
+must be identical. Every --autosave-every keystrokes the autosave body is
+measured both as the full content and as the changed span.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import MARKDOWN_EXTENSIONS  # noqa: E402
+from drafts import apply_changes  # noqa: E402
+from preview import PreviewRenderer, split_blocks  # noqa: E402
+
+WORDS = ('the a of to and in is it that for on with as was at by this from are be or an which one '
+         'post blog flask query index cache worker request page render editor draft preview block '
+         'latency memory server client response template markdown database snapshot delta').split()
+
+
+def percentile(timings, fraction):
+    return timings[max(0, int(len(timings) * fraction) - 1)]
+
+
+def sentence(rng):
+    words = rng.choices(WORDS, k=rng.randint(8, 20))
+    if rng.random() < 0.3:
+        words[rng.randrange(len(words))] = '**' + rng.choice(WORDS) + '**'
+    return ' '.join(words).capitalize() + '.'
+
+
+def paragraph(rng):
+    return ' '.join(sentence(rng) for _ in range(rng.randint(2, 5)))
+
+
+CODE = 'def render(post):\n    html = markdown(post.content)\n\n    return html\n'
+
+
+def html_post(rng, size):
+    parts = []
+    while sum(map(len, parts)) < size:
+        kind = rng.random()
+        if kind < 0.1:
+            parts.append(f'<h2>{sentence(rng)}</h2>')
+        elif kind < 0.2:
+            parts.append('<ul>' + ''.join(f'<li>{sentence(rng)}</li>' for _ in range(3)) + '</ul>')
+        elif kind < 0.25:
+            parts.append(f'<pre><code class="language-python">{CODE}</code></pre>')
+        elif kind < 0.3:
+            parts.append('<figure class="image"><img src="/uploads/photo.jpg"></figure>')
+        else:
+            parts.append(f'<p>{paragraph(rng)}</p>')
+    return ''.join(parts)
+
+
+def markdown_post(rng, size):
+    parts = []
+    while sum(map(len, parts)) < size:
+        kind = rng.random()
+        if kind < 0.1:
+            parts.append('## ' + sentence(rng))
+        elif kind < 0.2:
+            parts.append('\n'.join('- ' + sentence(rng) for _ in range(3)))
+        elif kind < 0.25:
+            parts.append(f'```python\n{CODE}```')
+        else:
+            parts.append(paragraph(rng))
+    return '\n\n'.join(parts) + '\n'
+
+
+def cursor(rng, text):
+    # Somewhere in running text, not inside a tag or a code fence.
+    while True:
+        position = rng.randrange(len(text))
+        if text[position] == ' ' and text[position - 1].isalpha():
+            return position
+
+
+def changed_span(before, after):
+    start, limit = 0, min(len(before), len(after))
+    while start < limit and before[start] == after[start]:
+        start += 1
+    tail = 0
+    while tail < limit - start and before[len(before) - 1 - tail] == after[len(after) - 1 - tail]:
+        tail += 1
+    return [start, len(before) - tail, after[start:len(after) - tail]]
+
+
+def run(name, text, args, rng):
+    import markdown
+
+    renderer = PreviewRenderer(MARKDOWN_EXTENSIONS)
+    renderer(text)
+    pieces = len(split_blocks(renderer.markdown(), text))
+    renderer.render_piece.cache_clear()
+    renderer(text)
+    full_times, preview_times, full_bytes, delta_bytes = [], [], [], []
+    saved = text
+    for number in range(1, args.keystrokes + 1):
+        # Typing goes on where the cursor is, which now and then moves.
+        if number % 50 == 1:
+            position = cursor(rng, text)
+        text = text[:position] + rng.choice('etaoinshr ') + text[position:]
+        position += 1
+        started = time.perf_counter()
+        expected = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS)
+        full_times.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        html = renderer(text)
+        preview_times.append((time.perf_counter() - started) * 1000)
+        assert html == expected, f'{name}: preview differs from the full render after keystroke {number}'
+        if number % args.autosave_every == 0:
+            change = changed_span(saved, text)
+            assert apply_changes(saved, [change]) == text
+            full_bytes.append(len(json.dumps({'title': 'Post', 'content': text})))
+            delta_bytes.append(len(json.dumps({'version': 1, 'changes': [change], 'length': len(text)})))
+            saved = text
+    full_times.sort()
+    preview_times.sort()
+    info = renderer.render_piece.cache_info()
+    print(f'{name}: {len(text)} characters, {pieces} pieces, {info.hits / (info.hits + info.misses):.1%} cached')
+    print(f'  full render  p50 {statistics.median(full_times):.2f}ms  p95 {percentile(full_times, 0.95):.2f}ms')
+    print(f'  preview      p50 {statistics.median(preview_times):.2f}ms  p95 {percentile(preview_times, 0.95):.2f}ms')
+    print(f'  autosave body {statistics.median(full_bytes):.0f} bytes in full, '
+          f'{statistics.median(delta_bytes):.0f} bytes as a change every {args.autosave_every} keystrokes')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=50_000, help='characters in the post')
+    parser.add_argument('--keystrokes', type=int, default=500)
+    parser.add_argument('--autosave-every', type=int, default=20, help='keystrokes between autosaves')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    run('editor HTML', html_post(rng, args.size), args, rng)
+    run('Markdown', markdown_post(rng, args.size), args, rng)
+
+
+if __name__ == '__main__':
+    main()
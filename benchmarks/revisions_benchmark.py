@@ -0,0 +1,114 @@
+"""Measure post revision storage and the cost of rebuilding old revisions.
+
+    python benchmarks/revisions_benchmark.py --posts 20 --edits 500
+
+Builds a throwaway SQLite database with the app's post_revision table and
+saves every post --edits times, each save changing a few lines the way an
+author revising a draft does (rewording a sentence, adding or dropping a
+paragraph). Reports the bytes stored against keeping a full copy of every
+revision, the time to save one, and the time to rebuild a random
+revision, which reads its nearest snapshot and the deltas after it.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from revisions import add_revision, create_revision_table, get_revision  # noqa: E402
+
+WORDS = ('the a of to and in is it that for on with as was at by this from are be or an which one '
+         'post blog flask query index cache worker request page render editor draft revision table '
+         'latency memory server client response template markdown database snapshot delta').split()
+
+
+def percentile(timings, fraction):
+    return timings[max(0, int(len(timings) * fraction) - 1)]
+
+
+def sentence(rng):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(8, 20))).capitalize() + '.'
+
+
+def paragraph(rng):
+    return ' '.join(sentence(rng) for _ in range(rng.randint(2, 6))) + '\n'
+
+
+def edit(rng, lines):
+    lines = list(lines)
+    for _ in range(rng.choice((1, 1, 1, 2, 3))):
+        action = rng.random()
+        index = rng.randrange(len(lines))
+        if action < 0.6:
+            words = lines[index].split()
+            start = rng.randrange(len(words))
+            words[start:start + rng.randint(1, 4)] = rng.choices(WORDS, k=rng.randint(1, 4))
+            lines[index] = ' '.join(words) + '\n'
+        elif action < 0.85 or len(lines) < 4:
+            lines.insert(index, paragraph(rng))
+        else:
+            del lines[index]
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=20)
+    parser.add_argument('--edits', type=int, default=500, help='saves per post')
+    parser.add_argument('--paragraphs', type=int, default=30, help='paragraphs in the first version')
+    parser.add_argument('--reads', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{os.path.join(tmp, "bench.db")}')
+        with engine.begin() as conn:
+            create_revision_table(conn)
+
+        full_bytes, save_timings, versions = 0, [], {}
+        with engine.begin() as conn:
+            for post_id in range(1, args.posts + 1):
+                lines = [paragraph(rng) for _ in range(args.paragraphs)]
+                previous, number = None, 0
+                while number < args.edits:
+                    content = ''.join(lines)
+                    lines = edit(rng, lines)
+                    if content == previous:
+                        continue
+                    full_bytes += len(content.encode('utf-8'))
+                    started = time.perf_counter()
+                    number = add_revision(conn, post_id, f'Post {post_id}', content)
+                    save_timings.append((time.perf_counter() - started) * 1000)
+                    if number in (1, args.edits // 2, args.edits):
+                        versions[post_id, number] = content
+                    previous = content
+            stored, snapshots = conn.exec_driver_sql(
+                'SELECT sum(length(data)), sum(snapshot) FROM post_revision').one()
+
+        print(f'{args.posts} posts x {args.edits} revisions: '
+              f'{stored / 1024:.0f}KB stored, {full_bytes / 1024:.0f}KB as full copies '
+              f'({full_bytes / stored:.0f}x smaller), {snapshots} snapshots')
+        save_timings.sort()
+        print(f'save:    p50 {statistics.median(save_timings):.2f}ms  '
+              f'p95 {percentile(save_timings, 0.95):.2f}ms  max {save_timings[-1]:.2f}ms')
+
+        with engine.connect() as conn:
+            for (post_id, number), content in versions.items():
+                assert get_revision(conn, post_id, number).content == content, (post_id, number)
+            timings = []
+            for _ in range(args.reads):
+                post_id, number = rng.randint(1, args.posts), rng.randint(1, args.edits)
+                started = time.perf_counter()
+                get_revision(conn, post_id, number)
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        print(f'rebuild: p50 {statistics.median(timings):.2f}ms  '
+              f'p95 {percentile(timings, 0.95):.2f}ms  max {timings[-1]:.2f}ms')
+
+if __name__ == '__main__':
+    main()
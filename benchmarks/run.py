@@ -0,0 +1,367 @@
+"""Benchmark the blog's main endpoints and write a comparable JSON report.
+
+    python benchmarks/run.py --mode wsgi --scale 1k -o report.json
+    python benchmarks/run.py --mode gunicorn --database /tmp/bench/blog.db --compare baseline.json
+
+``wsgi`` drives the Flask app in-process through its WSGI interface;
+``gunicorn`` starts a local gunicorn with the worker/thread counts from
+gunicorn_config.py and drives it over HTTP. Without --database a fresh
+database is seeded at --scale. Each scenario reports p50/p95/p99 latency,
+throughput and errors; the report also records server RSS. With --compare,
+scenarios whose p95 or throughput regressed by more than --tolerance are
+listed and the exit status is 1.
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import platform
+import re
+import resource
+import runpy
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CSRF_RE = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+
+class WSGIClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, files=None):
+        form = dict(data or {})
+        for name, (filename, content) in (files or {}).items():
+            form[name] = (io.BytesIO(content), filename)
+        response = self.client.open(path, method=method, data=form)
+        return response.status_code, response.get_data()
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def request(self, method, path, data=None, files=None):
+        body, headers = None, {}
+        if files:
+            body, content_type = _multipart(data or {}, files)
+            headers['Content-Type'] = content_type
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    out = io.BytesIO()
+    for name, value in fields.items():
+        out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        out.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                  f'Content-Type: application/octet-stream\r\n\r\n'.encode())
+        out.write(content)
+        out.write(b'\r\n')
+    out.write(f'--{boundary}--\r\n'.encode())
+    return out.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class Session:
+    """A logged-in client with the CSRF token the forms would carry."""
+
+    def __init__(self, client):
+        self.client = client
+        status, body = client.request('GET', '/login')
+        self.token = _csrf_token(body)
+        status, body = client.request('POST', '/login', {
+            'username': 'admin', 'password': 'admin', 'csrf_token': self.token})
+        if status != 302:
+            raise RuntimeError(f'login failed with HTTP {status}')
+        status, body = client.request('GET', '/post/new')
+        self.token = _csrf_token(body)
+
+    def get(self, path):
+        return self.client.request('GET', path)
+
+    def post(self, path, data=None, files=None):
+        return self.client.request('POST', path, dict(data or {}, csrf_token=self.token), files)
+
+
+def _csrf_token(body):
+    match = CSRF_RE.search(body.decode('utf-8', 'replace'))
+    return match.group(1) if match else ''
+
+
+def build_scenarios(setup_session):
+    """Return {name: callable(session) -> status}, creating the fixtures they need."""
+    status, _ = setup_session.post('/post/new', {
+        'title': 'Benchmark post', 'content_required': '## Benchmark\n\n```python\nprint("hi")\n```\n'})
+    status, body = setup_session.get('/')
+    post_id = int(re.search(r'/post/(\d+)/edit', body.decode()).group(1))
+    status, body = setup_session.post('/upload', files={'upload': ('bench.bin', os.urandom(256 * 1024))})
+    upload_path = urllib.parse.urlparse(json.loads(body)['url']).path
+
+    def edit_post(session):
+        status, _ = session.get(f'/post/{post_id}/edit')
+        if status != 200:
+            return status
+        status, _ = session.post(f'/post/{post_id}/edit', {
+            'title': 'Benchmark post', 'content_required': f'## Edited {time.time()}\n\n```python\nprint("hi")\n```\n'})
+        return status
+
+    return {
+        'index': lambda session: session.get('/')[0],
+        'edit_post': edit_post,
+        'upload_file': lambda session: session.post(
+            '/upload', files={'upload': (f'{uuid.uuid4().hex}.bin', os.urandom(64 * 1024))})[0],
+        'uploaded_file': lambda session: session.get(upload_path)[0],
+        'chat': lambda session: session.post('/chat', {'message': 'benchmark'})[0],
+        'ai_tools': lambda session: session.get('/ai-tools')[0],
+    }
+
+
+def run_scenario(make_session, action, concurrency, requests):
+    sessions = [make_session() for _ in range(concurrency)]
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def worker(session):
+        nonlocal errors
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                status = action(session)
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, args=(session,)) for session in sessions]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 2),
+        'p50_ms': round(_percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def _rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            return int(re.search(r'VmRSS:\s+(\d+)', f.read()).group(1))
+    except (OSError, AttributeError):
+        return None
+
+
+def _child_pids(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_environment(args, workdir):
+    database = os.path.abspath(args.database) if args.database else os.path.join(workdir, 'blog.db')
+    os.environ.update({
+        'DATABASE_URL': f'sqlite:///{database}',
+        'PAGE_CACHE_PATH': os.path.join(workdir, 'page_cache.db'),
+        'METRICS_PATH': os.path.join(workdir, 'metrics.db'),
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'FEED_PATH': os.path.join(workdir, 'feeds'),
+        'STATIC_SITE_DEPS_PATH': os.path.join(workdir, 'static_site.db'),
+        'LOGIN_THROTTLE_PATH': os.path.join(workdir, 'login_throttle.db'),
+        'SETTINGS_STAMP_PATH': os.path.join(workdir, 'settings.stamp'),
+        'USER_STAMP_PATH': os.path.join(workdir, 'users.stamp'),
+        'CHAT_TOKEN_DELAY': '0',
+    })
+    if args.database:
+        return database
+    os.chdir(workdir)
+    from benchmarks.seed import seed
+    seed(args.scale, quiet=True)
+    return database
+
+
+def run_wsgi(args, workdir):
+    os.chdir(workdir)
+    import app as blog
+    flask_app = blog.prepare_app()
+    blog.init_db()
+    make_session = lambda: Session(WSGIClient(flask_app))
+    scenarios = build_scenarios(make_session())
+    results = {name: run_scenario(make_session, scenarios[name], args.concurrency, args.requests)
+               for name in args.scenarios}
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results, {'max_rss_kb': max_rss}
+
+
+def run_gunicorn(args, workdir):
+    config = runpy.run_path(os.path.join(ROOT, 'gunicorn_config.py'))
+    port = _free_port()
+    env = dict(os.environ, DATABASE_PROFILE='production', DB_POOL_SIZE=str(config['threads']))
+    command = [sys.executable, '-m', 'gunicorn', '--pythonpath', ROOT, '--chdir', workdir,
+               '--bind', f'127.0.0.1:{port}', '--workers', str(config['workers']),
+               '--threads', str(config['threads']), '--worker-class', config['worker_class'],
+               '--log-level', 'warning', 'app:prepare_app()']
+    server = subprocess.Popen(command, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base_url + '/login', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError('gunicorn did not start')
+        make_session = lambda: Session(HTTPClient(base_url))
+        scenarios = build_scenarios(make_session())
+        results = {name: run_scenario(make_session, scenarios[name], args.concurrency, args.requests)
+                   for name in args.scenarios}
+        workers = _child_pids(server.pid)
+        worker_rss = [rss for rss in map(_rss_kb, workers) if rss]
+        server_stats = {
+            'master_rss_kb': _rss_kb(server.pid),
+            'worker_rss_kb': worker_rss,
+            'total_rss_kb': (_rss_kb(server.pid) or 0) + sum(worker_rss),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return results, server_stats
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for name, result in report['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        if before['p95_ms'] and result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {before["p95_ms"]}ms -> {result["p95_ms"]}ms')
+        if result['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(f'{name}: throughput {before["throughput_rps"]} -> {result["throughput_rps"]} req/s')
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    scenario_names = ['index', 'edit_post', 'upload_file', 'uploaded_file', 'chat', 'ai_tools']
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('wsgi', 'gunicorn'), default='wsgi')
+    parser.add_argument('--scale', choices=('1k', '100k', '1m'), default='1k',
+                        help='size of the seeded database when --database is not given')
+    parser.add_argument('--database', help='existing SQLite database to benchmark (see benchmarks/seed.py)')
+    parser.add_argument('--scenarios', nargs='+', choices=scenario_names, default=scenario_names)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('-o', '--output', help='write the JSON report here')
+    parser.add_argument('--compare', help='baseline report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='blog-bench-')
+    try:
+        database = prepare_environment(args, workdir)
+        runner = run_wsgi if args.mode == 'wsgi' else run_gunicorn
+        results, server = runner(args, workdir)
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'mode': args.mode,
+        'database': args.database or f'seeded:{args.scale}',
+        'concurrency': args.concurrency,
+        'requests_per_scenario': args.requests,
+        'server': server,
+        'scenarios': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if (baseline.get('mode'), baseline.get('database')) != (report['mode'], report['database']):
+            print(f'warning: baseline was {baseline.get("mode")} on {baseline.get("database")}', file=sys.stderr)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Measure full-text search latency on a synthetic post table.
+
+    python benchmarks/search_benchmark.py --posts 100000
+
+Builds a throwaway SQLite database with the same FTS5 schema and triggers
+the app uses, then times ranked, snippet-producing searches against it.
+Words follow a Zipf distribution like natural text, so latency is reported
+separately for rare, medium and very common terms: BM25 ranking has to score
+every matching row, so a term found in most posts costs the most.
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search import create_search_index, search_posts  # noqa: E402
+
+VOCABULARY_SIZE = 50_000
+SYLLABLES = 'ka lo mi ne ru sa ti vo ze pa de gi hu fo ja'.split()
+
+
+def make_vocabulary():
+    words = []
+    for i in range(VOCABULARY_SIZE):
+        word, n = '', i
+        while True:
+            word += SYLLABLES[n % len(SYLLABLES)]
+            n //= len(SYLLABLES)
+            if not n:
+                break
+        words.append(word + 'x')
+    return words
+
+
+def percentile(timings, fraction):
+    return timings[max(0, int(len(timings) * fraction) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    words = make_vocabulary()
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f'sqlite:///{os.path.join(tmp, "bench.db")}')
+        with engine.begin() as conn:
+            conn.exec_driver_sql('CREATE TABLE post (id INTEGER PRIMARY KEY, title TEXT NOT NULL, content TEXT NOT NULL)')
+            create_search_index(conn)
+
+        started = time.perf_counter()
+        batch = 5000
+        with engine.begin() as conn:
+            for start in range(0, args.posts, batch):
+                rows = [(' '.join(rng.choices(words, cum_weights=cum_weights, k=6)), ' '.join(rng.choices(words, cum_weights=cum_weights, k=300)))
+                        for _ in range(min(batch, args.posts - start))]
+                conn.exec_driver_sql('INSERT INTO post (title, content) VALUES (?, ?)', rows)
+        print(f'indexed {args.posts} posts in {time.perf_counter() - started:.1f}s')
+
+        buckets = {
+            'rare': words[5000:],
+            'medium': words[200:5000],
+            'common': words[10:200],
+        }
+        with engine.connect() as conn:
+            for name, pool in buckets.items():
+                timings = []
+                for _ in range(args.queries):
+                    query = ' '.join(rng.sample(pool, rng.choice((1, 2))))
+                    if rng.random() < 0.2:
+                        query = query[:-2]  # prefix match on the last word
+                    started = time.perf_counter()
+                    search_posts(conn, query, args.page_size, rng.choice((0, 0, 0, args.page_size * 5)))
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                print(f'{name:>6} terms, {len(timings)} queries: '
+                      f'p50 {statistics.median(timings):.2f}ms  '
+                      f'p95 {percentile(timings, 0.95):.2f}ms  '
+                      f'max {timings[-1]:.2f}ms')
+
+if __name__ == '__main__':
+    main()
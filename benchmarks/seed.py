@@ -0,0 +1,141 @@
+"""Bulk-generate users and posts for benchmarking.
+
+    DATABASE_URL=sqlite:////tmp/bench/blog.db python benchmarks/seed.py --scale 100k
+
+Posts mix prose, lists, tables and fenced code in several languages, like a
+technical blog. Bodies are assembled from a pool of variants that are each
+rendered to HTML once, so even the 1M scale doesn't spend hours in
+Pygments, yet every post gets a correct pre-rendered content_html.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCALES = {
+    '1k': (20, 1_000),
+    '100k': (500, 100_000),
+    '1m': (5_000, 1_000_000),
+}
+
+WORDS = ('cache worker request response latency query index template render session cursor '
+         'thread process memory deploy nginx gunicorn upload image search ranking snippet token '
+         'stream database sqlite python flask markdown pipeline queue batch schema migration '
+         'benchmark profile metric histogram throughput backend frontend bundle asset').split()
+
+CODE_SAMPLES = {
+    'python': '''def fib(n):
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+print([fib(i) for i in range({n})])''',
+    'javascript': '''async function load(url) {
+  const response = await fetch(url);
+  if (!response.ok) throw new Error(response.status);
+  return (await response.json()).items.slice(0, {n});
+}''',
+    'sql': '''SELECT p.id, p.title, COUNT(*) AS hits
+FROM post p JOIN post_view v ON v.post_id = p.id
+WHERE p.created_at > date('now', '-{n} days')
+GROUP BY p.id ORDER BY hits DESC LIMIT 10;''',
+    'bash': '''for i in $(seq 1 {n}); do
+  curl -s -o /dev/null -w "%{{http_code}}\\n" http://127.0.0.1:8000/
+done''',
+}
+
+
+def sentence(rng, words=12):
+    text = ' '.join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + '.'
+
+
+def make_body(rng):
+    parts = []
+    for _ in range(rng.randint(3, 7)):
+        kind = rng.random()
+        if kind < 0.45:
+            parts.append(' '.join(sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(2, 5))))
+        elif kind < 0.8:
+            language = rng.choice(list(CODE_SAMPLES))
+            code = CODE_SAMPLES[language].replace('{n}', str(rng.randint(2, 99))).replace('{{', '{').replace('}}', '}')
+            parts.append(f'```{language}\n{code}\n```')
+        elif kind < 0.9:
+            parts.append('\n'.join(f'- **{rng.choice(WORDS)}**: {sentence(rng, 6)}' for _ in range(rng.randint(3, 6))))
+        else:
+            rows = '\n'.join(f'| {rng.choice(WORDS)} | {rng.randint(1, 999)} ms |' for _ in range(rng.randint(2, 5)))
+            parts.append(f'| Step | Time |\n|------|------|\n{rows}')
+    return f'## {sentence(rng, 4)[:-1]}\n\n' + '\n\n'.join(parts) + '\n'
+
+
+def seed(scale=None, users=None, posts=None, variants=300, batch_size=5000, seed_value=1, quiet=False):
+    import app as blog
+    from werkzeug.security import generate_password_hash
+
+    default_users, default_posts = SCALES[scale or '1k']
+    users = users or default_users
+    posts = posts or default_posts
+    rng = random.Random(seed_value)
+    log = (lambda *a, **k: None) if quiet else print
+
+    blog.init_db()
+    with blog.app.app_context():
+        started = time.perf_counter()
+        # One hash for every synthetic account: hashing is the slow part.
+        password_hash = generate_password_hash('password')
+        first_user = blog.db.session.query(blog.db.func.max(blog.User.id)).scalar() or 0
+        blog.db.session.execute(blog.User.__table__.insert(), [
+            {'username': f'user{first_user + i}', 'password_hash': password_hash} for i in range(users)
+        ])
+        blog.db.session.commit()
+        user_ids = [user_id for user_id, in blog.db.session.query(blog.User.id)]
+        log(f'{users} users in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        bodies = [make_body(rng) for _ in range(variants)]
+        rendered = [(body, blog.render_markdown(body)) for body in bodies]
+        log(f'rendered {variants} body variants in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        now = datetime.utcnow()
+        spread = timedelta(days=3 * 365) / max(posts, 1)
+        post_table = blog.Post.__table__
+        for start in range(0, posts, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, posts)):
+                content, content_html = rng.choice(rendered)
+                rows.append({
+                    'title': sentence(rng, rng.randint(3, 8))[:100],
+                    'content': content,
+                    'content_html': content_html,
+                    'render_version': blog.MARKDOWN_RENDER_VERSION,
+                    'created_at': now - spread * (posts - i),
+                    'user_id': rng.choice(user_ids),
+                })
+            blog.db.session.execute(post_table.insert(), rows)
+            blog.db.session.commit()
+            log(f'  {start + len(rows)}/{posts} posts', end='\r')
+        log(f'{posts} posts in {time.perf_counter() - started:.1f}s')
+        blog.page_cache.invalidate()
+    return users, posts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k')
+    parser.add_argument('--users', type=int, help='override the number of users for --scale')
+    parser.add_argument('--posts', type=int, help='override the number of posts for --scale')
+    parser.add_argument('--variants', type=int, default=300, help='distinct post bodies to render')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    seed(args.scale, args.users, args.posts, args.variants, args.batch_size, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import importlib
+import re
+import time
+
+
+class ChatBackend:
+    """Interface for chat model backends.
+
+    ``stream()`` yields the reply as text fragments as soon as they are
+    available; the /chat/stream route forwards each one to the browser as a
+    Server-Sent Event.
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def stream(self, message):
+        raise NotImplementedError
+
+    def reply(self, message):
+        return ''.join(self.stream(message))
+
+
+class EchoBackend(ChatBackend):
+    """Local stand-in for a model: echoes the message a word at a time."""
+
+    def stream(self, message):
+        delay = self.config.get('CHAT_TOKEN_DELAY', 0.05)
+        for token in re.findall(r'\S+\s*', f'Echo: {message}'):
+            time.sleep(delay)  # cooperative under gevent workers
+            yield token
+
+    def reply(self, message):
+        # The delay only imitates a model generating; a whole reply is instant.
+        return f'Echo: {message}'
+
+
+BACKENDS = {
+    'echo': EchoBackend,
+}
+
+
+def load_chat_backend(config):
+    """Build the backend named by ``CHAT_BACKEND``: a key of BACKENDS or 'module:Class'."""
+    spec = config.get('CHAT_BACKEND', 'echo')
+    if spec in BACKENDS:
+        backend_class = BACKENDS[spec]
+    else:
+        module_name, _, class_name = spec.partition(':')
+        backend_class = getattr(importlib.import_module(module_name), class_name)
+    return backend_class(config)
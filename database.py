@@ -0,0 +1,83 @@
+import sqlite3
+
+import sqlalchemy as sa
+from flask_sqlalchemy.session import Session
+
+READER_BIND = 'reader'
+
+# Applied to every connection when DATABASE_PROFILE=production. WAL lets
+# readers carry on while the single writer commits; busy_timeout makes a
+# second writer wait instead of failing with "database is locked".
+PRODUCTION_PRAGMAS = {
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+def production_config(uri, pool_size):
+    """Flask config for separate pooled writer and reader engines on one SQLite file."""
+    return {
+        # One pooled writer connection per worker: concurrent writers queue in
+        # the pool rather than contending for SQLite's write lock.
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 30},
+        'SQLALCHEMY_BINDS': {
+            READER_BIND: {'url': uri, 'pool_size': pool_size, 'max_overflow': pool_size, 'pool_timeout': 30},
+        },
+    }
+
+
+def configure_engines(db):
+    """Install the production pragmas on the engines created by ``production_config``."""
+    for bind_key, engine in db.engines.items():
+        if engine.dialect.name != 'sqlite':
+            continue
+        sa.event.listen(engine, 'connect', _pragma_listener(read_only=bind_key == READER_BIND))
+
+
+def _pragma_listener(read_only):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in PRODUCTION_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        # WAL is persistent in the database file, so only the first
+        # connection ever has to switch it. Switching needs an exclusive lock
+        # that SQLite won't wait for; if several workers race at first boot,
+        # the losers simply find it done on their next connection.
+        if cursor.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+            try:
+                cursor.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.OperationalError:
+                pass
+        if read_only:
+            cursor.execute('PRAGMA query_only=ON')
+        cursor.close()
+    return set_pragmas
+
+
+class RoutingSession(Session):
+    """Send reads to the reader engine and flushes/DML to the default writer.
+
+    Once the session has written in its current transaction, later reads stay
+    on the writer so they see their own uncommitted changes.
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engines = self._db.engines
+        if bind is None and READER_BIND in engines:
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self._wrote = True
+            elif not self._wrote:
+                return engines[READER_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@sa.event.listens_for(RoutingSession, 'after_transaction_end')
+def _reset_write_routing(session, transaction):
+    if transaction.parent is None:
+        session._wrote = False
@@ -22,6 +22,9 @@ source venv/bin/activate
 # 安装依赖
 pip install -r requirements.txt
 
+# 打包前端资源到 static/dist（assets/vendor 中缺少的第三方文件会先下载；无法联网时页面改用固定版本的 CDN 地址）
+flask --app app build-assets --fetch
+
 # 设置 Nginx
 sudo cp nginx.conf /etc/nginx/sites-available/cursor-blog
 sudo ln -s /etc/nginx/sites-available/cursor-blog /etc/nginx/sites-enabled/
@@ -30,7 +33,7 @@ sudo nginx -t
 sudo systemctl restart nginx
 
 # 启动 Gunicorn
-gunicorn -c gunicorn_config.py app:app
+gunicorn -c gunicorn_config.py
 
 # 设置开机自启
 sudo tee /etc/systemd/system/cursor-blog.service << EOF
@@ -43,7 +46,7 @@ User=$USER
 Group=www-data
 WorkingDirectory=/var/www/cursor-blog
 Environment="PATH=/var/www/cursor-blog/venv/bin"
-ExecStart=/var/www/cursor-blog/venv/bin/gunicorn -c gunicorn_config.py app:app
+ExecStart=/var/www/cursor-blog/venv/bin/gunicorn -c gunicorn_config.py
 
 [Install]
 WantedBy=multi-user.target
@@ -0,0 +1,114 @@
+from collections import namedtuple
+from datetime import datetime
+
+# The autosaved, not yet published state of a post being written (post_id
+# 0) or edited, one per user and post. Each save bumps version; a delta is
+# only applied to the version it was computed against.
+DRAFT_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS post_draft (
+        user_id INTEGER NOT NULL,
+        post_id INTEGER NOT NULL,
+        version INTEGER NOT NULL,
+        updated_at TEXT NOT NULL,
+        title TEXT NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (user_id, post_id)
+    )""",
+]
+
+Draft = namedtuple('Draft', 'version updated_at title content')
+
+
+class DraftConflict(Exception):
+    """The draft changed since the version a delta was computed against."""
+
+    def __init__(self, version):
+        super().__init__(f'Draft is at version {version}')
+        self.version = version
+
+
+def create_draft_table(conn):
+    for statement in DRAFT_SCHEMA:
+        conn.exec_driver_sql(statement)
+
+
+def utf16_length(text):
+    return len(text.encode('utf-16-le')) // 2
+
+
+def apply_changes(content, changes):
+    """Apply ``[start, end, text]`` replacements to ``content`` in order.
+
+    Offsets count UTF-16 code units, as JavaScript string indexes do.
+    ValueError if a change is out of range or splits a surrogate pair.
+    """
+    data = content.encode('utf-16-le')
+    for change in changes:
+        if not (isinstance(change, list) and len(change) == 3):
+            raise ValueError('A change is [start, end, text]')
+        start, end, text = change
+        if not (type(start) is int and type(end) is int and isinstance(text, str)
+                and 0 <= start <= end <= len(data) // 2):
+            raise ValueError('Change out of range')
+        try:
+            data = data[:start * 2] + text.encode('utf-16-le') + data[end * 2:]
+        except UnicodeEncodeError:
+            raise ValueError('Change splits a character') from None
+    try:
+        return data.decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise ValueError('Change splits a character') from None
+
+
+def get_draft(conn, user_id, post_id):
+    row = conn.exec_driver_sql(
+        'SELECT version, updated_at, title, content FROM post_draft WHERE user_id = ? AND post_id = ?',
+        (user_id, post_id)).first()
+    if row is None:
+        return None
+    return Draft(row.version, datetime.fromisoformat(row.updated_at), row.title, row.content)
+
+
+def save_draft(conn, user_id, post_id, base_version, title=None, content=None, changes=None, length=None,
+               when=None):
+    """Store a new version of a draft from its full ``content`` or from ``changes`` to ``base_version``.
+
+    ``title`` None keeps the saved title. ``length`` is the content's length
+    in UTF-16 code units after the changes, as the client counted it.
+    Returns the saved Draft; raises DraftConflict when ``changes`` don't
+    apply to the stored draft, and ValueError when anything is malformed.
+    """
+    if not (type(base_version) is int and isinstance(title, (str, type(None)))
+            and (isinstance(content, str) if changes is None else isinstance(changes, list) and content is None)
+            and (length is None or type(length) is int)):
+        raise ValueError('Malformed draft')
+    draft = get_draft(conn, user_id, post_id)
+    current = draft.version if draft else 0
+    if content is None:
+        if draft is None or current != base_version:
+            raise DraftConflict(current)
+        content = apply_changes(draft.content, changes)
+        if length is not None and utf16_length(content) != length:
+            raise DraftConflict(current)
+    if title is None:
+        title = draft.title if draft else ''
+    updated_at = (when or datetime.utcnow()).strftime('%Y-%m-%d %H:%M:%S.%f')
+    # The version check in the UPDATE catches a save from another tab
+    # between the read above and this write.
+    if draft is None:
+        saved = conn.exec_driver_sql(
+            'INSERT INTO post_draft (user_id, post_id, version, updated_at, title, content) '
+            'VALUES (?, ?, 1, ?, ?, ?) ON CONFLICT (user_id, post_id) DO NOTHING',
+            (user_id, post_id, updated_at, title, content)).rowcount
+    else:
+        saved = conn.exec_driver_sql(
+            'UPDATE post_draft SET version = version + 1, updated_at = ?, title = ?, content = ? '
+            'WHERE user_id = ? AND post_id = ? AND version = ?',
+            (updated_at, title, content, user_id, post_id, current)).rowcount
+    if not saved:
+        raise DraftConflict(current)
+    return Draft(current + 1, datetime.fromisoformat(updated_at), title, content)
+
+
+def delete_draft(conn, user_id, post_id):
+    conn.exec_driver_sql('DELETE FROM post_draft WHERE user_id = ? AND post_id = ?', (user_id, post_id))
@@ -0,0 +1,161 @@
+import fcntl
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from xml.sax.saxutils import escape, quoteattr
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+
+def _iso(when):
+    return when.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _rfc822(when):
+    return when.strftime('%a, %d %b %Y %H:%M:%S +0000')
+
+
+def atom_feed(title, subtitle, site_url, feed_url, entries):
+    """An Atom document; ``entries`` are dicts with url, title, author, published, updated, html."""
+    updated = max((entry['updated'] for entry in entries), default=None)
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n',
+        f'<feed xmlns="{ATOM_NS}">\n',
+        f'<title>{escape(title)}</title>\n',
+        f'<subtitle>{escape(subtitle or "")}</subtitle>\n',
+        f'<id>{escape(site_url)}</id>\n',
+        f'<link href={quoteattr(site_url)}/>\n',
+        f'<link rel="self" type="application/atom+xml" href={quoteattr(feed_url)}/>\n',
+    ]
+    if updated:
+        parts.append(f'<updated>{_iso(updated)}</updated>\n')
+    for entry in entries:
+        parts.append(
+            f'<entry>\n<title>{escape(entry["title"])}</title>\n'
+            f'<id>{escape(entry["url"])}</id>\n'
+            f'<link href={quoteattr(entry["url"])}/>\n'
+            f'<author><name>{escape(entry["author"])}</name></author>\n'
+            f'<published>{_iso(entry["published"])}</published>\n'
+            f'<updated>{_iso(entry["updated"])}</updated>\n'
+            f'<content type="html">{escape(entry["html"])}</content>\n</entry>\n')
+    parts.append('</feed>\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def rss_feed(title, description, site_url, feed_url, entries):
+    """An RSS 2.0 document for the same entries as atom_feed()."""
+    parts = [
+        '<?xml version="1.0" encoding="utf-8"?>\n',
+        f'<rss version="2.0" xmlns:atom="{ATOM_NS}">\n<channel>\n',
+        f'<title>{escape(title)}</title>\n',
+        f'<link>{escape(site_url)}</link>\n',
+        f'<description>{escape(description or "")}</description>\n',
+        f'<atom:link rel="self" type="application/rss+xml" href={quoteattr(feed_url)}/>\n',
+    ]
+    if entries:
+        parts.append(f'<lastBuildDate>{_rfc822(max(e["updated"] for e in entries))}</lastBuildDate>\n')
+    for entry in entries:
+        parts.append(
+            f'<item>\n<title>{escape(entry["title"])}</title>\n'
+            f'<link>{escape(entry["url"])}</link>\n'
+            f'<guid isPermaLink="true">{escape(entry["url"])}</guid>\n'
+            f'<pubDate>{_rfc822(entry["published"])}</pubDate>\n'
+            f'<description>{escape(entry["html"])}</description>\n</item>\n')
+    parts.append('</channel>\n</rss>\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def sitemap(urls):
+    """A sitemap for ``(loc, lastmod)`` pairs; lastmod may be None."""
+    parts = ['<?xml version="1.0" encoding="utf-8"?>\n', f'<urlset xmlns="{SITEMAP_NS}">\n']
+    for loc, lastmod in urls:
+        lastmod = f'<lastmod>{_iso(lastmod)}</lastmod>' if lastmod else ''
+        parts.append(f'<url><loc>{escape(loc)}</loc>{lastmod}</url>\n')
+    parts.append('</urlset>\n')
+    return ''.join(parts).encode('utf-8')
+
+
+def sitemap_index(sitemaps):
+    """A sitemap index for ``(loc, lastmod)`` pairs of child sitemaps."""
+    parts = ['<?xml version="1.0" encoding="utf-8"?>\n', f'<sitemapindex xmlns="{SITEMAP_NS}">\n']
+    for loc, lastmod in sitemaps:
+        lastmod = f'<lastmod>{lastmod}</lastmod>' if lastmod else ''
+        parts.append(f'<sitemap><loc>{escape(loc)}</loc>{lastmod}</sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts).encode('utf-8')
+
+
+class ArtifactStore:
+    """Generated files kept next to a gzip copy, shared by every worker.
+
+    Writes replace files atomically and leave them alone when the content
+    is unchanged, so their mtime (Last-Modified) and ETag only move when a
+    reader would actually see something new.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name, compressed=False):
+        return os.path.join(self.directory, name + ('.gz' if compressed else ''))
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    @contextmanager
+    def lock(self):
+        """Serialize rebuilds across processes, so the last one to run wins."""
+        with open(os.path.join(self.directory, '.lock'), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def write(self, name, data):
+        path = self.path(name)
+        try:
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return False
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        # Fixed mtime in the gzip header: the same content compresses identically.
+        with open(tmp + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp + '.gz', path + '.gz')
+        os.replace(tmp, path)
+        return True
+
+    def remove(self, name):
+        for path in (self.path(name), self.path(name, compressed=True)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def read_state(self, name):
+        try:
+            with open(self.path(name)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write_state(self, name, state):
+        path = self.path(name)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name != '.lock':
+                os.remove(os.path.join(self.directory, name))
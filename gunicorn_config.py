@@ -1,8 +1,35 @@
+import os
+
+# The module-level app, returned by prepare_app() once it has done the setup
+# a serving process needs (see its docstring); it is not an app factory.
+wsgi_app = "app:prepare_app()"
 bind = "127.0.0.1:8000"
 workers = 4
 threads = 2
+# Streaming chat holds a connection for the whole reply; with the default
+# gthread workers that is one of the threads above. `pip install gevent` and
+# set GUNICORN_WORKER_CLASS=gevent to serve hundreds of concurrent streams.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+worker_connections = 1000
 timeout = 120
 accesslog = "access.log"
 errorlog = "error.log"
 capture_output = True
-daemon = True 
\ No newline at end of file
+daemon = True
+raw_env = [
+    "DATABASE_PROFILE=production",
+    f"DB_POOL_SIZE={threads}",
+    # Behind the bundled nginx: trust one hop of X-Forwarded-For.
+    "PROXY_COUNT=1",
+]
+# Load the app once in the master and fork the workers from it: they start
+# (and restart) without importing anything and share the loaded code pages.
+# Code changes then need a full restart, not just a HUP. gevent has to patch
+# the standard library before the app is imported, so it loads per worker.
+preload_app = worker_class != "gevent"
+
+
+def post_fork(server, worker):
+    # The master's engines may hold pooled connections; a worker must open its own.
+    from app import dispose_engines
+    dispose_engines()
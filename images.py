@@ -0,0 +1,55 @@
+import importlib.util
+import os
+
+# Pillow is optional; without it uploads are served as-is. It is imported
+# only when derivatives are generated, not by every process that serves pages.
+HAVE_PILLOW = importlib.util.find_spec('PIL') is not None
+
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+WEBP_QUALITY = 80
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+
+
+def can_derive(filename):
+    return HAVE_PILLOW and os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def derivative_name(source, width):
+    stem = os.path.splitext(source)[0]
+    return f'{stem}.w{width}.webp'
+
+
+def generate_derivatives(upload_folder, source):
+    """Write resized WebP copies of ``source`` next to it.
+
+    Returns ``[(width, name, size_in_bytes)]``. Images narrower than a target
+    width get one copy at their own width instead of being upscaled;
+    animated images and files Pillow can't read get none.
+    """
+    if not can_derive(source):
+        return []
+    from PIL import Image, ImageOps, UnidentifiedImageError
+    source_path = os.path.join(upload_folder, *source.split('/'))
+    try:
+        with Image.open(source_path) as image:
+            if getattr(image, 'is_animated', False):
+                return []
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+            derivatives = []
+            for width in sorted({min(width, image.width) for width in DERIVATIVE_WIDTHS}):
+                name = derivative_name(source, width)
+                path = os.path.join(upload_folder, *name.split('/'))
+                if not os.path.exists(path):
+                    height = max(1, round(image.height * width / image.width))
+                    resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                    tmp_path = f'{path}.{os.getpid()}.tmp'
+                    resized.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, path)
+                derivatives.append((width, name, os.path.getsize(path)))
+            return derivatives
+    except (UnidentifiedImageError, OSError):
+        return []
@@ -1,9 +1,10 @@
-from app import app, db, User, Settings
+from app import app, db, upgrade_db, bump_settings_stamp, User, Settings
 
 def init_database():
     with app.app_context():
         # Create all tables
         db.create_all()
+        upgrade_db()
         
         # Create default admin user if not exists
         if not User.query.filter_by(username='admin').first():
@@ -23,6 +24,7 @@ def init_database():
         
         # Commit changes
         db.session.commit()
+        bump_settings_stamp()
 
 if __name__ == '__main__':
     init_database()
@@ -0,0 +1,191 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+# name -> (help, label, bucket upper bounds)
+HISTOGRAMS = {
+    'blog_request_duration_seconds': (
+        'Request latency by endpoint.', 'endpoint',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)),
+    'blog_request_sql_queries': (
+        'SQL statements executed per request, by endpoint.', 'endpoint',
+        (0, 1, 2, 3, 5, 10, 20, 50, 100)),
+    'blog_sql_query_duration_seconds': (
+        'SQL statement latency by endpoint.', 'endpoint',
+        (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)),
+    'blog_template_render_seconds': (
+        'Jinja template render time by template.', 'template',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)),
+    'blog_markdown_render_seconds': (
+        'Markdown render time by endpoint.', 'endpoint',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)),
+}
+
+
+class Metrics:
+    """Histograms aggregated in process memory and shared through SQLite.
+
+    Each process periodically writes a snapshot of its own totals under its
+    own key; rendering sums the snapshots of every process that has ever
+    written, so the totals stay monotonic as gunicorn workers come and go.
+    """
+
+    def __init__(self, path, flush_interval=5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS process_metrics ('
+                         'process TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _ensure_process(self):
+        # Start from zero in every new (e.g. freshly forked) process.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._process_key = f'{self._pid}-{time.time():.6f}'
+            self._series = {}
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def observe(self, name, label_value, value):
+        buckets = HISTOGRAMS[name][2]
+        with self._lock:
+            self._ensure_process()
+            key = f'{name}\x00{label_value}'
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(buckets) + 3)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(buckets)] += 1
+            series[-2] += value
+            series[-1] += 1
+            self._dirty = True
+
+    def maybe_flush(self):
+        if self._pid == os.getpid() and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._ensure_process()
+            if not self._dirty:
+                return
+            data = json.dumps(self._series)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO process_metrics (process, data, updated_at) VALUES (?, ?, ?)',
+                         (self._process_key, data, time.time()))
+
+    def render(self):
+        """All processes' histograms in Prometheus text exposition format."""
+        self.flush()
+        totals = {}
+        with self._connect() as conn:
+            for data, in conn.execute('SELECT data FROM process_metrics'):
+                for key, series in json.loads(data).items():
+                    total = totals.setdefault(key, [0] * len(series))
+                    for i, value in enumerate(series):
+                        total[i] += value
+
+        lines = []
+        for name, (help_text, label, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            prefix = f'{name}\x00'
+            for key in sorted(k for k in totals if k.startswith(prefix)):
+                series = totals[key]
+                label_pair = f'{label}="{_escape(key[len(prefix):])}"'
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), series):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label_pair},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label_pair}}} {series[-2]:.6f}')
+                lines.append(f'{name}_count{{{label_pair}}} {series[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or '<unmatched>'
+    return '<no request>'
+
+
+def instrument(app, engines, metrics, slow_request_seconds=None):
+    """Record request, SQL and template timings for ``app`` into ``metrics``.
+
+    With ``slow_request_seconds`` set, requests that take longer are logged
+    together with their slowest SQL statements.
+    """
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql_count = 0
+        g.metrics_sql_time = 0.0
+        g.metrics_sql_log = [] if slow_request_seconds else None
+
+    @app.teardown_request
+    def record_request(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = current_endpoint()
+        metrics.observe('blog_request_duration_seconds', endpoint, elapsed)
+        metrics.observe('blog_request_sql_queries', endpoint, g.metrics_sql_count)
+        if slow_request_seconds and elapsed >= slow_request_seconds:
+            slowest = sorted(g.metrics_sql_log, reverse=True)[:5]
+            app.logger.warning(
+                'Slow request %s %s (%s): %.3fs, %d SQL statements in %.3fs%s',
+                request.method, request.path, endpoint, elapsed,
+                g.metrics_sql_count, g.metrics_sql_time,
+                ''.join(f'\n  {seconds * 1000:.1f}ms  {" ".join(statement.split())[:300]}'
+                        for seconds, statement in slowest))
+        metrics.maybe_flush()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_started'].pop()
+        if has_request_context() and 'metrics_started' in g:
+            g.metrics_sql_count += 1
+            g.metrics_sql_time += elapsed
+            if g.metrics_sql_log is not None:
+                g.metrics_sql_log.append((elapsed, statement))
+            metrics.observe('blog_sql_query_duration_seconds', current_endpoint(), elapsed)
+
+    for engine in engines:
+        sa.event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        sa.event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    def template_started(sender, template, context, **extra):
+        g.setdefault('metrics_template_timers', []).append(time.perf_counter())
+
+    def template_finished(sender, template, context, **extra):
+        timers = g.get('metrics_template_timers')
+        if timers:
+            metrics.observe('blog_template_render_seconds', template.name or '<string>',
+                            time.perf_counter() - timers.pop())
+
+    before_render_template.connect(template_started, app, weak=False)
+    template_rendered.connect(template_finished, app, weak=False)
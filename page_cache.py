@@ -0,0 +1,56 @@
+import hashlib
+
+from shared_state import SharedSQLite
+
+
+class PageCache(SharedSQLite):
+    """Rendered-page store shared by every worker process through one SQLite file.
+
+    Entries are tagged with the generation that was current when rendering
+    started; bumping the generation invalidates everything at once, and a
+    render that races with a write can never be served afterwards.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 1), generation INTEGER NOT NULL)',
+        'INSERT OR IGNORE INTO meta (id, generation) VALUES (1, 0)',
+        'CREATE TABLE IF NOT EXISTS pages ('
+        'key TEXT PRIMARY KEY, generation INTEGER NOT NULL, '
+        'etag TEXT NOT NULL, mimetype TEXT NOT NULL, body BLOB NOT NULL)',
+    )
+
+    def generation(self):
+        return self._connect().execute('SELECT generation FROM meta WHERE id = 1').fetchone()[0]
+
+    def get(self, key):
+        """Return ``(etag, mimetype, body)`` for a current entry, or None."""
+        return self._connect().execute(
+            'SELECT p.etag, p.mimetype, p.body FROM pages p JOIN meta m ON m.id = 1 '
+            'WHERE p.key = ? AND p.generation = m.generation', (key,)
+        ).fetchone()
+
+    def set(self, key, generation, body, mimetype):
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        self._connect().execute(
+            'INSERT OR REPLACE INTO pages (key, generation, etag, mimetype, body) VALUES (?, ?, ?, ?, ?)',
+            (key, generation, etag, mimetype, body)
+        )
+        return etag
+
+    def invalidate_path(self, path):
+        """Drop the cached pages for ``path``, whatever their query string."""
+        # '@' sorts right after '?', so the range covers every 'path?...' key.
+        self._connect().execute(
+            'DELETE FROM pages WHERE key = ? OR (key >= ? AND key < ?)', (path, path + '?', path + '@')
+        )
+
+    def invalidate(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE meta SET generation = generation + 1 WHERE id = 1')
+            conn.execute('DELETE FROM pages WHERE generation < (SELECT generation FROM meta WHERE id = 1)')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
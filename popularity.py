@@ -0,0 +1,100 @@
+import atexit
+import math
+import os
+import threading
+import time
+from collections import Counter
+
+import sqlalchemy as sa
+
+# Scores are stored as the log of an exponentially growing weight measured
+# from this fixed epoch (forward decay): a view at time t adds
+# 2 ** ((t - SCORE_EPOCH) / half_life). Every row is scaled by the same factor
+# as time passes, so ordering by the stored column already orders by decayed
+# popularity and no row ever needs rewriting. Changing the half-life only
+# takes full effect once old views have decayed away.
+SCORE_EPOCH = 1704067200  # 2024-01-01T00:00:00Z
+
+UPSERT_VIEWS = sa.text(
+    'INSERT INTO post_stats (post_id, views, score) '
+    'SELECT :post_id, :views, :score WHERE EXISTS (SELECT 1 FROM post WHERE id = :post_id) '
+    'ON CONFLICT (post_id) DO UPDATE SET '
+    'views = views + excluded.views, score = logaddexp(score, excluded.score)'
+)
+
+
+def view_score(views, when, half_life):
+    """Log-space score contribution of ``views`` views at unix time ``when``."""
+    return math.log(views) + (when - SCORE_EPOCH) * math.log(2) / half_life
+
+
+def logaddexp(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def register_sql_functions(engine):
+    @sa.event.listens_for(engine, 'connect')
+    def _connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function('logaddexp', 2, logaddexp, deterministic=True)
+
+
+class ViewCounter:
+    """Post view tallies kept in process memory and written behind in batches.
+
+    A background thread in each worker flushes the counts gathered since the
+    last flush as one executemany UPSERT into post_stats, so a burst of views
+    costs one short write transaction per worker every ``flush_interval``
+    seconds instead of one per view. Counts not yet flushed when a worker
+    dies are lost.
+    """
+
+    def __init__(self, engine, half_life, flush_interval=10.0, on_flush=None, logger=None):
+        self.engine = engine
+        self.half_life = half_life
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._pid = None
+        atexit.register(self.flush)
+
+    def _ensure_process(self):
+        # Start empty, with a fresh flusher thread, in every (forked) process.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = Counter()
+            threading.Thread(target=self._run, name='view-counter', daemon=True).start()
+
+    def hit(self, post_id):
+        with self._lock:
+            self._ensure_process()
+            self._pending[post_id] += 1
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                if self.logger:
+                    self.logger.exception('Could not flush post view counts')
+
+    def flush(self):
+        with self._lock:
+            if self._pid != os.getpid() or not self._pending:
+                return 0
+            pending, self._pending = self._pending, Counter()
+        now = time.time()
+        rows = [{'post_id': post_id, 'views': views, 'score': view_score(views, now, self.half_life)}
+                for post_id, views in pending.items()]
+        with self.engine.begin() as conn:
+            conn.execute(UPSERT_VIEWS, rows)
+        if self.on_flush:
+            self.on_flush()
+        return len(rows)
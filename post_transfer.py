@@ -0,0 +1,162 @@
+import json
+import os
+import re
+from datetime import datetime
+
+FORMATS = ('jsonl', 'markdown')
+TITLE_MAX_LENGTH = 100
+
+FRONT_MATTER_RE = re.compile(r'\A---\r?\n(.*?)\r?\n---\r?\n?', re.S)
+HEADING_RE = re.compile(r'^#\s+(.+?)\s*#*\s*$', re.M)
+EXPORT_NAME_RE = re.compile(r'^(\d+)-.*\.md$')
+
+
+class TransferError(ValueError):
+    """A source record that can't be imported."""
+
+
+def guess_format(path):
+    return 'markdown' if os.path.isdir(path) else 'jsonl'
+
+
+def read_jsonl(path, start=0):
+    """Yield ``(offset, record)`` for each post after byte ``start``.
+
+    ``offset`` is the byte position just past the record's line, so an
+    import can resume with ``start=offset``.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as error:
+                raise TransferError(f'{path} at byte {offset - len(line)}: {error}') from None
+            yield offset, post_record(data, f'{path} at byte {offset - len(line)}')
+
+
+def markdown_files(directory):
+    """The ``.md`` files under ``directory`` in the stable order imports use."""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.md'))
+    return paths
+
+
+def read_markdown(directory, start=0):
+    """Yield ``(position, record)`` for each Markdown file after the first ``start``."""
+    for position, path in enumerate(markdown_files(directory)[start:], start + 1):
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        yield position, parse_markdown(text, path)
+
+
+def parse_markdown(text, path):
+    """A post from Markdown with optional ``key: value`` front matter.
+
+    Without a ``title`` the first ``# heading`` is used (and removed from the
+    body), then the file name.
+    """
+    data = {}
+    match = FRONT_MATTER_RE.match(text)
+    if match:
+        for line in match.group(1).splitlines():
+            key, sep, value = line.partition(':')
+            if sep and key.strip():
+                data[key.strip().lower()] = value.strip()
+        text = text[match.end():]
+    if not data.get('title'):
+        heading = HEADING_RE.search(text)
+        if heading and not text[:heading.start()].strip():
+            data['title'] = heading.group(1)
+            text = text[heading.end():].lstrip('\r\n')
+        else:
+            data['title'] = os.path.splitext(os.path.basename(path))[0].replace('-', ' ').replace('_', ' ')
+    data['content'] = text
+    data.setdefault('created_at', data.pop('date', None))
+    return post_record(data, path)
+
+
+def post_record(data, where):
+    """Validate a decoded post: ``{title, content, author?, created_at?}``."""
+    if not isinstance(data, dict):
+        raise TransferError(f'{where}: expected an object')
+    title, content = data.get('title'), data.get('content')
+    if not isinstance(title, str) or not title.strip():
+        raise TransferError(f'{where}: title must be a non-empty string')
+    if len(title.strip()) > TITLE_MAX_LENGTH:
+        raise TransferError(f'{where}: title is longer than {TITLE_MAX_LENGTH} characters')
+    if not isinstance(content, str):
+        raise TransferError(f'{where}: content must be a string')
+    author = data.get('author')
+    if author is not None and (not isinstance(author, str) or not author.strip()):
+        raise TransferError(f'{where}: author must be a non-empty string')
+    created_at = data.get('created_at')
+    if created_at:
+        try:
+            created_at = datetime.fromisoformat(str(created_at).replace('Z', '+00:00'))
+        except ValueError:
+            raise TransferError(f'{where}: created_at is not an ISO 8601 date') from None
+        if created_at.tzinfo is not None:
+            # Stored timestamps are naive UTC.
+            created_at = datetime.utcfromtimestamp(created_at.timestamp())
+    return {
+        'title': title.strip(),
+        'content': content,
+        'author': author.strip() if author else None,
+        'created_at': created_at or None,
+    }
+
+
+def jsonl_line(post_id, title, content, created_at, author):
+    return json.dumps({
+        'id': post_id,
+        'title': title,
+        'author': author,
+        'created_at': created_at.isoformat(),
+        'content': content,
+    }, ensure_ascii=False) + '\n'
+
+
+def markdown_document(post_id, title, content, created_at, author):
+    return (f'---\nid: {post_id}\ntitle: {" ".join(title.split())}\nauthor: {author}\n'
+            f'created_at: {created_at.isoformat()}\n---\n{content}')
+
+
+def markdown_filename(post_id, title):
+    slug = re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-')[:60] or 'post'
+    return f'{post_id:07d}-{slug}.md'
+
+
+def last_exported_id(path, fmt):
+    """The highest post id already in an export, trimming a torn last JSONL line."""
+    if fmt == 'markdown':
+        ids = [int(m.group(1)) for m in map(EXPORT_NAME_RE.match, os.listdir(path)) if m] if os.path.isdir(path) else []
+        return max(ids, default=0)
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        # Walk back in chunks to the start of the last complete line.
+        position, tail = end, b''
+        while position > 0:
+            size = min(65536, position)
+            position -= size
+            f.seek(position)
+            tail = f.read(size) + tail
+            lines = tail.split(b'\n')
+            if len(lines) >= 3:
+                break
+        if not tail.endswith(b'\n'):
+            cut = tail.rfind(b'\n') + 1
+            f.truncate(position + cut)
+            tail = tail[:cut]
+        complete = [line for line in tail.split(b'\n') if line.strip()]
+        if not complete:
+            return 0
+        return int(json.loads(complete[-1])['id'])
@@ -0,0 +1,193 @@
+import re
+from functools import lru_cache
+
+# Link, footnote and abbreviation definitions apply to the whole document,
+# so a document that may have any of them is rendered in one piece. They
+# can sit in quotes and list items and their labels can span lines, so any
+# `]:` counts.
+DEFINITION_RE = re.compile(r'\][ ]?:')
+# Blocks Python-Markdown joins to the block before them even across a blank
+# line: indented continuations, more items of a list, quote or definition
+# list. A list or quote can also start after a raw HTML element's closing tag.
+LIST_ITEM_RE = re.compile(r'(?:^|>)[ ]{0,3}(?:[*+-]|\d+\.)[ ]+', re.MULTILINE)
+QUOTE_RE = re.compile(r'(?:^|>)[ ]{0,3}>', re.MULTILINE)
+DEFINITION_ITEM_RE = re.compile(r'^[ ]{0,3}:[ ]+', re.MULTILINE)
+# Between two top-level HTML elements that may be rendered apart.
+HTML_GAP_RE = re.compile(r'[ ]*\n?')
+
+# Rendered around each piece so Markdown sees it between other blocks, as it
+# does in the whole document, and so the whitespace it puts after the piece
+# survives the final strip().
+SENTINEL = 'zqxpreviewsentinelzqx'
+SENTINEL_HTML = f'<p>{SENTINEL}</p>'
+SENTINEL_ELEMENT = f'<div>{SENTINEL}</div>'
+
+
+def _is_blank(line):
+    return not line.strip(' \t\n')
+
+
+def _html_blocks(md, text):
+    """Where Python-Markdown's HTML preprocessor finds raw HTML in ``text``.
+
+    Returns ``(spans, starts)``: the ``(start, end)`` of every top-level
+    element or multi-line comment it keeps as raw HTML, and the offsets at
+    which a raw element starts straight after another one ended. Markdown's
+    own extractor is used, so this follows the pinned version's rules.
+    """
+    from markdown.extensions.md_in_html import HTMLExtractorExtra
+
+    class Extractor(HTMLExtractorExtra):
+        def __init__(self, *args, **kwargs):
+            self.spans, self.starts = [], []
+            self.opened = self.closed = self.pending = None
+            super().__init__(*args, **kwargs)
+
+        def position(self):
+            return self.line_offset + self.offset
+
+        def is_open(self):
+            return self.inraw or bool(self.mdstack)
+
+        def handle_starttag(self, tag, attrs):
+            start, was_open = self.position(), self.is_open()
+            super().handle_starttag(tag, attrs)
+            if self.is_open() and not was_open:
+                self.opened = start
+                if (self.closed is not None and self.pending is None
+                        and HTML_GAP_RE.fullmatch(self.rawdata, self.closed, start)):
+                    self.starts.append(start)
+
+        def handle_endtag(self, tag):
+            end = self.position() + len(self.get_endtag_text(tag))
+            was_open = self.is_open()
+            super().handle_endtag(tag)
+            if was_open and not self.is_open():
+                self.spans.append((self.opened, end))
+                self.closed = end
+            if self.pending is not None and not self._cache:
+                self.spans.append((self.pending, end))
+                self.pending = None
+
+        def handle_empty_tag(self, data, is_block):
+            if '\n' in data:
+                self.spans.append((self.position(), self.position() + len(data)))
+            self.closed = None
+            super().handle_empty_tag(data, is_block)
+            # An entity or comment after an element's closing tag is held
+            # back and stored with the next raw element, however far away.
+            if self._cache and not self.inraw and self.pending is None:
+                self.pending = self.position()
+
+    extractor = Extractor(md)
+    extractor.feed(text)
+    md.htmlStash.reset()
+    if extractor.is_open():
+        extractor.spans.append((extractor.opened, len(text)))
+    if extractor.pending is not None:
+        extractor.spans.append((extractor.pending, len(text)))
+    return extractor.spans, extractor.starts
+
+
+def split_blocks(md, text):
+    """Cut Markdown source into pieces that render the same apart as together.
+
+    Returns ``[(piece, gap)]``, where ``gap`` is the blank-line text that
+    separated the piece from the next one, or '' when the next piece is an
+    HTML element that began on the same or the following line. Pieces end
+    at blank lines outside fenced code and raw HTML, and between top-level
+    HTML elements, which is where editor HTML gives many small pieces.
+    """
+    from markdown.extensions.fenced_code import FencedBlockPreprocessor
+
+    # Markdown's own first step; tabs must be expanded before a line is cut.
+    text = text.replace('\x02', '').replace('\x03', '').replace('\r\n', '\n').replace('\r', '\n')
+    text = text.expandtabs(md.tab_length)
+    if DEFINITION_RE.search(text):
+        return [(text, '\n\n')]
+    fences = [match.span() for match in FencedBlockPreprocessor.FENCED_BLOCK_RE.finditer(text)]
+    # The HTML preprocessor runs after fenced code has been taken out.
+    masked = text
+    for start, end in fences:
+        masked = masked[:start] + re.sub(r'[^\n]', 'x', masked[start:end]) + masked[end:]
+    spans, starts = _html_blocks(md, masked)
+    covered = []
+    for start, end in sorted(fences + spans):
+        if covered and start <= covered[-1][1]:
+            covered[-1] = (covered[-1][0], max(end, covered[-1][1]))
+        else:
+            covered.append((start, end))
+
+    # Chunks between blank lines that may end a block.
+    chunks, position, chunk_start, index = [], 0, None, 0
+    for line in text.splitlines(keepends=True):
+        while index < len(covered) and covered[index][1] <= position:
+            index += 1
+        inside = index < len(covered) and covered[index][0] < position
+        if _is_blank(line) and not inside:
+            if chunk_start is not None:
+                chunks.append((chunk_start, position))
+                chunk_start = None
+        elif chunk_start is None:
+            chunk_start = position
+        position += len(line)
+    if chunk_start is not None:
+        chunks.append((chunk_start, position))
+
+    blocks = []
+    for start, end in chunks:
+        chunk = text[start:end]
+        if blocks and (chunk[0] in ' \t:'
+                       or (chunk[0] == '>' and QUOTE_RE.search(text, *blocks[-1]))
+                       or (LIST_ITEM_RE.match(chunk) and LIST_ITEM_RE.search(text, *blocks[-1]))):
+            blocks[-1] = (blocks[-1][0], end)
+        else:
+            blocks.append((start, end))
+        # A definition turns the paragraph before it into a term, which
+        # joins any definition list before that.
+        while (len(blocks) > 1 and DEFINITION_ITEM_RE.search(text, *blocks[-1])
+               and DEFINITION_ITEM_RE.search(text, *blocks[-2])):
+            blocks[-2:] = [(blocks[-2][0], blocks[-1][1])]
+
+    pieces = []
+    for number, (start, end) in enumerate(blocks):
+        cuts = [start] + [cut for cut in starts if start < cut < end] + [end]
+        for a, b in zip(cuts, cuts[1:]):
+            pieces.append([text[a:b], ''])
+        next_start = blocks[number + 1][0] if number + 1 < len(blocks) else None
+        pieces[-1][1] = text[end:next_start] if next_start is not None else '\n\n'
+    return [tuple(piece) for piece in pieces]
+
+
+class PreviewRenderer:
+    """Render Markdown exactly as ``markdown.markdown`` does, caching the HTML of each piece.
+
+    Only pieces not seen recently are rendered, so a keystroke in a long
+    post re-renders the paragraph or element it changed.
+    """
+
+    def __init__(self, extensions, cache_size=4096):
+        self.extensions = extensions
+        self.render_piece = lru_cache(maxsize=cache_size)(self._render_piece)
+
+    def markdown(self):
+        # A new instance every time: reset() keeps abbreviations registered
+        # by an earlier document, which would leak into other users' posts.
+        import markdown
+        return markdown.Markdown(extensions=self.extensions)
+
+    def _render_piece(self, piece, gap):
+        md = self.markdown()
+        suffix, suffix_html = (gap + SENTINEL, SENTINEL_HTML) if gap else (SENTINEL_ELEMENT, SENTINEL_ELEMENT)
+        html = md.convert(f'{SENTINEL}\n\n{piece}{suffix}')
+        prefix_html = SENTINEL_HTML + '\n'
+        if html.startswith(prefix_html) and html.endswith(suffix_html):
+            return html[len(prefix_html):-len(suffix_html)]
+        return md.reset().convert(piece) + '\n'
+
+    def __call__(self, text):
+        text = text or ''
+        if DEFINITION_RE.search(text):
+            # Rendered in one piece anyway, and too big to be worth caching.
+            return self.markdown().convert(text)
+        return ''.join(self.render_piece(piece, gap) for piece, gap in split_blocks(self.markdown(), text)).strip()
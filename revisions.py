@@ -0,0 +1,181 @@
+import difflib
+import json
+import re
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+# Every saved version of a post. A row holds either the whole content
+# (snapshot = 1) or a delta against the revision before it, both
+# zlib-compressed. A snapshot is written at least every SNAPSHOT_INTERVAL
+# revisions, and whenever a delta wouldn't be much smaller, so rebuilding
+# any revision reads one snapshot and fewer than SNAPSHOT_INTERVAL deltas.
+# Titles are short and stored as they are.
+REVISION_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS post_revision (
+        post_id INTEGER NOT NULL,
+        number INTEGER NOT NULL,
+        created_at TEXT NOT NULL,
+        user_id INTEGER,
+        title TEXT NOT NULL,
+        snapshot INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (post_id, number)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_post_revision_snapshot ON post_revision (post_id, number) WHERE snapshot",
+]
+
+SNAPSHOT_INTERVAL = 20
+# Store a snapshot instead of a delta that is more than this fraction of it.
+MAX_DELTA_RATIO = 0.5
+
+# Diffs work on runs of text ending in a newline or '>': lines for Markdown,
+# and tags and the text between them for the editor's single-line HTML.
+_TOKEN_RE = re.compile(r'[^\n>]*[\n>]|[^\n>]+')
+
+Revision = namedtuple('Revision', 'number created_at user_id title content')
+RevisionInfo = namedtuple('RevisionInfo', 'number created_at username title size stored snapshot')
+
+
+def create_revision_table(conn):
+    for statement in REVISION_SCHEMA:
+        conn.exec_driver_sql(statement)
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text)
+
+
+def make_delta(base, content):
+    """Compressed edit script turning ``base`` into ``content``.
+
+    A JSON list of ``[start, end]`` token ranges copied from ``base`` and
+    strings inserted between them.
+    """
+    old, new = _tokens(base), _tokens(content)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new).get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif j2 > j1:
+            text = ''.join(new[j1:j2])
+            if ops and isinstance(ops[-1], str):
+                ops[-1] += text
+            else:
+                ops.append(text)
+    return zlib.compress(json.dumps(ops, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def apply_delta(base, delta):
+    old = _tokens(base)
+    return ''.join(''.join(old[op[0]:op[1]]) if isinstance(op, list) else op
+                   for op in json.loads(zlib.decompress(delta)))
+
+
+def _format_time(when):
+    # The format SQLAlchemy uses for DateTime columns on SQLite.
+    return when.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def latest_revision(conn, post_id):
+    return conn.exec_driver_sql(
+        'SELECT max(number) FROM post_revision WHERE post_id = ?', (post_id,)).scalar()
+
+
+def add_revision(conn, post_id, title, content, user_id=None, when=None):
+    """Append ``title``/``content`` as the post's newest revision; returns its number.
+
+    The delta is made against the newest revision as stored, read on
+    ``conn`` inside the write, not against what the caller last read: a
+    concurrent save may have added a revision since. Saves that change
+    nothing add no revision and return None.
+    """
+    latest = latest_revision(conn, post_id)
+    snapshot = True
+    data = zlib.compress(content.encode('utf-8'), 9)
+    if latest is not None:
+        base = get_revision(conn, post_id, latest).content
+        last_title = conn.exec_driver_sql(
+            'SELECT title FROM post_revision WHERE post_id = ? AND number = ?', (post_id, latest)).scalar()
+        if base == content and last_title == title:
+            return None
+        last_snapshot = conn.exec_driver_sql(
+            'SELECT number FROM post_revision WHERE post_id = ? AND snapshot ORDER BY number DESC LIMIT 1',
+            (post_id,)).scalar()
+        if latest + 1 - last_snapshot < SNAPSHOT_INTERVAL:
+            delta = make_delta(base, content)
+            if len(delta) <= len(data) * MAX_DELTA_RATIO:
+                snapshot, data = False, delta
+    number = (latest or 0) + 1
+    conn.exec_driver_sql(
+        'INSERT INTO post_revision (post_id, number, created_at, user_id, title, snapshot, size, data) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        (post_id, number, _format_time(when or datetime.utcnow()), user_id, title, int(snapshot),
+         len(content), data))
+    return number
+
+
+def get_revision(conn, post_id, number):
+    """Rebuild revision ``number`` from its nearest snapshot, or None if there is no such revision."""
+    rows = conn.exec_driver_sql(
+        'SELECT number, created_at, user_id, title, snapshot, data FROM post_revision '
+        'WHERE post_id = ? AND number <= ? AND number >= ('
+        '    SELECT number FROM post_revision WHERE post_id = ? AND snapshot AND number <= ? '
+        '    ORDER BY number DESC LIMIT 1) '
+        'ORDER BY number', (post_id, number, post_id, number)).all()
+    if not rows or rows[-1].number != number:
+        return None
+    content = None
+    for row in rows:
+        if row.snapshot:
+            content = zlib.decompress(row.data).decode('utf-8')
+        else:
+            content = apply_delta(content, row.data)
+    last = rows[-1]
+    return Revision(number, datetime.fromisoformat(last.created_at), last.user_id, last.title, content)
+
+
+def list_revisions(conn, post_id):
+    """Every revision of a post without its content, newest first."""
+    rows = conn.exec_driver_sql(
+        'SELECT r.number, r.created_at, u.username, r.title, r.size, length(r.data), r.snapshot '
+        'FROM post_revision r LEFT JOIN user u ON u.id = r.user_id '
+        'WHERE r.post_id = ? ORDER BY r.number DESC', (post_id,)).all()
+    return [RevisionInfo(number, datetime.fromisoformat(created_at), username, title, size, stored, bool(snapshot))
+            for number, created_at, username, title, size, stored, snapshot in rows]
+
+
+def delete_revisions(conn, post_id):
+    conn.exec_driver_sql('DELETE FROM post_revision WHERE post_id = ?', (post_id,))
+
+
+def diff_segments(old, new, context=200):
+    """``[(tag, text)]`` rendering of the changes from ``old`` to ``new``.
+
+    Tags are 'equal', 'delete' and 'insert'; unchanged stretches longer
+    than twice ``context`` characters keep only ``context`` characters on
+    each side, with a ('skip', number of characters left out) in between.
+    """
+    a, b = _tokens(old), _tokens(new)
+    opcodes = difflib.SequenceMatcher(None, a, b).get_opcodes()
+    segments = []
+    for index, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag != 'equal':
+            if i2 > i1:
+                segments.append(('delete', ''.join(a[i1:i2])))
+            if j2 > j1:
+                segments.append(('insert', ''.join(b[j1:j2])))
+            continue
+        text = ''.join(a[i1:i2])
+        head = context if index > 0 else 0
+        tail = context if index < len(opcodes) - 1 else 0
+        if len(text) <= head + tail + context:
+            segments.append(('equal', text))
+            continue
+        if head:
+            segments.append(('equal', text[:head]))
+        segments.append(('skip', len(text) - head - tail))
+        if tail:
+            segments.append(('equal', text[-tail:]))
+    return segments
@@ -0,0 +1,115 @@
+import re
+from html import unescape
+
+from markupsafe import Markup, escape
+
+# External-content FTS5 index over post.title/post.search_text, the words of
+# the rendered body without its markup. The triggers keep it in step with
+# every insert, delete and title/text update, whichever code path makes them.
+SEARCH_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(
+        title, search_text, content='post', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_ai AFTER INSERT ON post BEGIN
+        INSERT INTO post_fts (rowid, title, search_text) VALUES (new.id, new.title, new.search_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_ad AFTER DELETE ON post BEGIN
+        INSERT INTO post_fts (post_fts, rowid, title, search_text) VALUES ('delete', old.id, old.title, old.search_text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_au AFTER UPDATE OF title, search_text ON post BEGIN
+        INSERT INTO post_fts (post_fts, rowid, title, search_text) VALUES ('delete', old.id, old.title, old.search_text);
+        INSERT INTO post_fts (rowid, title, search_text) VALUES (new.id, new.title, new.search_text);
+    END""",
+]
+
+# bm25() column weights: a hit in the title counts ten times a body hit.
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+MIN_PREFIX_LENGTH = 3
+
+_HIGHLIGHT_START = '\x02'
+_HIGHLIGHT_END = '\x03'
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_HIDDEN_RE = re.compile(r'<!--.*?-->|<(script|style)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+_BLOCK_TAG_RE = re.compile(
+    r'</?(?:address|blockquote|br|dd|div|dl|dt|figcaption|figure|h[1-6]|hr|img|li|ol|p|pre|'
+    r'section|table|td|th|tr|ul)\b[^>]*>', re.IGNORECASE)
+_TAG_RE = re.compile(r'<[^>]*>')
+
+
+def plain_text(html):
+    """The words of rendered post HTML, as the search index stores them.
+
+    Markup, attributes, comments and scripts are dropped so that searching
+    for ``strong`` or ``href`` only finds posts that say so; block-level
+    tags become spaces so words in adjacent paragraphs stay apart.
+    """
+    text = _HIDDEN_RE.sub(' ', html or '')
+    text = _TAG_RE.sub('', _BLOCK_TAG_RE.sub(' ', text))
+    return ' '.join(unescape(text).split())
+
+
+def create_search_index(conn):
+    for statement in SEARCH_SCHEMA:
+        conn.exec_driver_sql(statement)
+
+
+def search_index_columns(conn):
+    return {row[1] for row in conn.exec_driver_sql('PRAGMA table_info(post_fts)')}
+
+
+def drop_search_index(conn):
+    for trigger in ('post_fts_ai', 'post_fts_ad', 'post_fts_au'):
+        conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.exec_driver_sql('DROP TABLE IF EXISTS post_fts')
+
+
+def rebuild_search_index(conn):
+    create_search_index(conn)
+    conn.exec_driver_sql("INSERT INTO post_fts (post_fts) VALUES ('rebuild')")
+
+
+def build_match_query(text):
+    """Turn free user input into a safe FTS5 query.
+
+    Every word is quoted so FTS5 operators in the input are taken literally,
+    words are ANDed together and the last one matches as a prefix once it is
+    long enough not to expand to half the vocabulary.
+    """
+    tokens = _TOKEN_RE.findall(text or '')
+    if not tokens:
+        return None
+    terms = ['"%s"' % token for token in tokens]
+    if len(tokens[-1]) >= MIN_PREFIX_LENGTH:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_posts(conn, text, limit, offset=0):
+    """Return ``[(post_id, title_html, snippet_html)]`` ranked by BM25."""
+    match = build_match_query(text)
+    if match is None:
+        return []
+    # Rank on rowids alone, then build highlights only for the page being
+    # shown; computing snippets inside the sort costs one per matching row.
+    post_ids = [row[0] for row in conn.exec_driver_sql(
+        'SELECT rowid FROM post_fts WHERE post_fts MATCH ? ORDER BY bm25(post_fts, ?, ?) LIMIT ? OFFSET ?',
+        (match, TITLE_WEIGHT, CONTENT_WEIGHT, limit, offset)
+    )]
+    if not post_ids:
+        return []
+    rows = conn.exec_driver_sql(
+        'SELECT rowid, highlight(post_fts, 0, ?, ?), snippet(post_fts, 1, ?, ?, ?, 24) '
+        'FROM post_fts WHERE post_fts MATCH ? AND rowid IN (%s)' % ', '.join('?' * len(post_ids)),
+        (_HIGHLIGHT_START, _HIGHLIGHT_END, _HIGHLIGHT_START, _HIGHLIGHT_END, '…', match, *post_ids)
+    ).fetchall()
+    by_id = {post_id: (title, snippet) for post_id, title, snippet in rows}
+    return [(post_id, _highlighted(by_id[post_id][0]), _highlighted(by_id[post_id][1]))
+            for post_id in post_ids if post_id in by_id]
+
+
+def _highlighted(text):
+    # Escape the indexed text first and only then turn the markers into <mark>.
+    html = str(escape(text))
+    return Markup(html.replace(_HIGHLIGHT_START, '<mark>').replace(_HIGHLIGHT_END, '</mark>'))
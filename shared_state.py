@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import threading
+import uuid
+
+
+class SharedSQLite:
+    """Base for state kept in one SQLite file shared by every worker process.
+
+    Subclasses list the statements that create their tables in SCHEMA; they
+    run, in WAL mode, when the file is opened. ``_connect()`` gives each
+    thread its own connection in autocommit mode.
+    """
+
+    SCHEMA = ()
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def _connect(self):
+        # One connection per thread, reopened after gunicorn forks a worker.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+class StampFile:
+    """A file every worker process checks to learn that shared data changed.
+
+    ``bump()`` atomically replaces it, which changes its inode; ``read()``
+    is a single os.stat() whose result differs after every bump.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def bump(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.path)
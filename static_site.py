@@ -0,0 +1,62 @@
+from shared_state import SharedSQLite
+
+# WSGI environ flag for requests made by the static site renderer: they skip
+# the page cache and view counting, and report what they depended on.
+ENVIRON_KEY = 'blog.static_export'
+DEPS_HEADER = 'X-Static-Deps'
+
+
+def output_name(path):
+    """File that serves ``path`` from the static directory ('/post/3' -> 'post/3/index.html')."""
+    path = path.strip('/')
+    return f'{path}/index.html' if path else 'index.html'
+
+
+def render(client, path):
+    """Render ``path`` anonymously; returns ``(status, body, dependency keys)``."""
+    response = client.get(path, environ_base={ENVIRON_KEY: True})
+    deps = response.headers.get(DEPS_HEADER, '').split()
+    return response.status_code, response.get_data(), deps
+
+
+class DependencyIndex(SharedSQLite):
+    """Which data each exported page was rendered from.
+
+    Pages are URL paths; keys name what they read, e.g. ``post:12``,
+    ``user:3``, ``settings`` or ``post-list``. A change to a key re-renders
+    exactly the pages recorded against it.
+    """
+
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS deps (page TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (page, key))',
+        'CREATE INDEX IF NOT EXISTS ix_deps_key ON deps (key)',
+    )
+
+    def pages(self):
+        return {page for page, in self._connect().execute('SELECT DISTINCT page FROM deps')}
+
+    def pages_for(self, keys):
+        keys, pages = list(keys), set()
+        # In batches: a bulk change can name more keys than SQLite takes parameters.
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ', '.join('?' * len(batch))
+            pages.update(page for page, in self._connect().execute(
+                f'SELECT DISTINCT page FROM deps WHERE key IN ({placeholders})', batch))
+        return pages
+
+    def update(self, results):
+        """Record ``(page, keys)`` pairs; ``keys`` of None forgets the page."""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for page, keys in results:
+                conn.execute('DELETE FROM deps WHERE page = ?', (page,))
+                if keys is not None:
+                    # A page with no recorded reads still needs a row to be known.
+                    conn.executemany('INSERT OR IGNORE INTO deps (page, key) VALUES (?, ?)',
+                                     [(page, key) for key in set(keys) | {'page'}])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
@@ -0,0 +1,46 @@
+import hashlib
+import os
+import tempfile
+
+from werkzeug.utils import secure_filename
+
+CHUNK_SIZE = 64 * 1024
+
+
+def blob_path(digest, ext):
+    """Relative path of a stored blob: two levels of shard directories, then the hash."""
+    return '/'.join((digest[:2], digest[2:4], digest + ext))
+
+
+def store_upload(file, upload_folder):
+    """Stream an uploaded file into content-addressed storage.
+
+    The body is copied to a temporary file in chunks while it is hashed, so
+    it never has to sit in worker memory as a whole, then moved to
+    ``<aa>/<bb>/<sha256><ext>``. Identical uploads share one blob. Returns
+    the path relative to ``upload_folder``.
+    """
+    ext = os.path.splitext(secure_filename(file.filename or ''))[1].lower()
+    digest = hashlib.sha256()
+    # prepare_app() makes the folder, but not every entry point calls it.
+    os.makedirs(upload_folder, mode=0o755, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                tmp.write(chunk)
+
+        name = blob_path(digest.hexdigest(), ext)
+        target = os.path.join(upload_folder, *name.split('/'))
+        if os.path.exists(target):
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(target), mode=0o755, exist_ok=True)
+            os.chmod(tmp_path, 0o644)  # Set proper file permissions
+            os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return name
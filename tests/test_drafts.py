@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from drafts import DraftConflict, apply_changes, create_draft_table, save_draft  # noqa: E402
+
+
+def test_offsets_count_utf16_code_units():
+    # '😀' is two code units in JavaScript, as in the browser's deltas.
+    assert apply_changes('a😀b', [[3, 4, 'c']]) == 'a😀c'
+    assert apply_changes('a😀b', [[1, 3, '']]) == 'ab'
+
+
+@pytest.mark.parametrize('change', [[2, 2, 'x'], [1, 2, ''], [2, 3, '']])
+def test_change_splitting_a_surrogate_pair_is_rejected(change):
+    with pytest.raises(ValueError, match='splits a character'):
+        apply_changes('a😀b', [change])
+
+
+@pytest.mark.parametrize('changes', [[[0, 9, '']], [[2, 1, '']], [[0, 1]], [['0', 1, '']], [[0, 1, 2]]])
+def test_malformed_changes_are_rejected(changes):
+    with pytest.raises(ValueError):
+        apply_changes('abc', changes)
+
+
+def test_delta_against_a_stale_version_conflicts():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        create_draft_table(conn)
+        save_draft(conn, 1, 0, 0, title='T', content='hello')
+        assert save_draft(conn, 1, 0, 1, changes=[[5, 5, ' world']], length=11).content == 'hello world'
+        with pytest.raises(DraftConflict) as conflict:
+            save_draft(conn, 1, 0, 1, changes=[[0, 0, '!']])
+        assert conflict.value.version == 2
+        with pytest.raises(DraftConflict):
+            save_draft(conn, 1, 0, 2, changes=[[0, 0, '!']], length=99)
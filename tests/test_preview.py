@@ -0,0 +1,23 @@
+import os
+import sys
+
+import markdown
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preview import PreviewRenderer  # noqa: E402
+
+EXTENSIONS = ['extra', 'codehilite']
+
+
+def test_abbreviations_do_not_leak_between_documents():
+    render = PreviewRenderer(EXTENSIONS)
+    render('x\n\n*[API]: Alice private note')
+    html = render('Bob writes about the API')
+    assert 'Alice' not in html
+    assert html == markdown.markdown('Bob writes about the API', extensions=EXTENSIONS)
+
+
+def test_definitions_inside_blocks_render_the_whole_document():
+    render = PreviewRenderer(EXTENSIONS)
+    for text in ('> *[Q]:\n> quoted title\n\nQ here', '- [r]: http://y\n\n[see][r]', '*[A\nB]: t\n\nA\nB'):
+        assert render(text) == markdown.markdown(text, extensions=EXTENSIONS)
@@ -0,0 +1,63 @@
+import os
+import random
+import sys
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from revisions import SNAPSHOT_INTERVAL, add_revision, apply_delta, create_revision_table, get_revision, make_delta  # noqa: E402,E501
+
+WORDS = 'alpha beta gamma delta <p> </p> <strong> </strong> \n é 😀'.split(' ')
+
+
+def html_post(rng, paragraphs):
+    return ''.join(f'<p>{" ".join(rng.choices(WORDS, k=rng.randint(3, 12)))}</p>' for _ in range(paragraphs))
+
+
+def edit(rng, content):
+    start = rng.randrange(len(content) + 1)
+    end = min(len(content), start + rng.choice([0, 0, 1, 5, 40, 400]))
+    return content[:start] + ''.join(rng.choices(WORDS, k=rng.randint(0, 6))) + content[end:]
+
+
+def engine():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        create_revision_table(conn)
+    return engine
+
+
+def test_delta_round_trip():
+    rng = random.Random(1)
+    for _ in range(500):
+        base = html_post(rng, rng.randint(0, 5))
+        content = edit(rng, base)
+        assert apply_delta(base, make_delta(base, content)) == content
+
+
+def test_random_edits_rebuild_every_revision():
+    rng = random.Random(2)
+    with engine().begin() as conn:
+        saved = {}
+        content = html_post(rng, 60)
+        for _ in range(SNAPSHOT_INTERVAL * 3):
+            number = add_revision(conn, 1, 'Post', content)
+            if number is not None:
+                saved[number] = content
+            content = edit(rng, content)
+        for number, content in saved.items():
+            assert get_revision(conn, 1, number).content == content
+
+
+def test_save_based_on_a_stale_read():
+    # Two tabs open the post at revision 1; A saves, then B saves what it
+    # edited from revision 1. Revision 3 must be B's content, not B's
+    # changes replayed onto A's.
+    rng = random.Random(3)
+    original = html_post(rng, 60)
+    ours, theirs = edit(rng, original), edit(rng, original)
+    with engine().begin() as conn:
+        add_revision(conn, 1, 'Post', original)
+        add_revision(conn, 1, 'Post', ours)
+        add_revision(conn, 1, 'Post', theirs)
+        assert [get_revision(conn, 1, number).content for number in (1, 2, 3)] == [original, ours, theirs]
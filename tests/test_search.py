@@ -0,0 +1,44 @@
+import os
+import sys
+
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search import create_search_index, plain_text, search_posts  # noqa: E402
+
+POSTS = [
+    (1, 'Formatting', '<p>Some <strong>bold</strong> words and a <a href="https://example.com/">link</a>.</p>'),
+    (2, 'Tags', '<p>Write &lt;strong&gt; for bold and set the href of links.</p>'),
+    (3, 'Lists', '<ul><li>first</li><li>second</li></ul><p>a&nbsp;b&amp;c</p>'),
+]
+
+
+def engine():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            'CREATE TABLE post (id INTEGER PRIMARY KEY, title TEXT, content TEXT, search_text TEXT)')
+        create_search_index(conn)
+        for post_id, title, html in POSTS:
+            conn.exec_driver_sql('INSERT INTO post VALUES (?, ?, ?, ?)', (post_id, title, html, plain_text(html)))
+    return engine
+
+
+def test_plain_text_drops_markup():
+    assert plain_text(POSTS[0][2]) == 'Some bold words and a link.'
+    assert plain_text(POSTS[2][2]) == 'first second a b&c'
+    assert plain_text('<p>x</p><script>var strong;</script><!-- href -->y') == 'x y'
+
+
+def test_markup_is_not_searchable():
+    with engine().begin() as conn:
+        assert [post_id for post_id, _, _ in search_posts(conn, 'strong', 10)] == [2]
+        assert [post_id for post_id, _, _ in search_posts(conn, 'href', 10)] == [2]
+        assert sorted(post_id for post_id, _, _ in search_posts(conn, 'bold', 10)) == [1, 2]
+
+
+def test_snippet_escapes_text_and_marks_hits():
+    with engine().begin() as conn:
+        [(_, title, snippet)] = search_posts(conn, 'href', 10)
+    assert str(title) == 'Tags'
+    assert str(snippet) == 'Write &lt;strong&gt; for bold and set the <mark>href</mark> of links.'
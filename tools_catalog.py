@@ -0,0 +1,81 @@
+import json
+from collections import namedtuple
+from functools import lru_cache
+
+Tool = namedtuple('Tool', 'name description url category popularity')
+
+SORT_ORDERS = ('popularity', 'name', 'category')
+MAX_POPULARITY = 5
+
+
+class ToolCatalog:
+    """The AI tools directory, loaded once and indexed for every query shape.
+
+    Filtering by category, sorting and paging only slice lists built at load
+    time; free-text search scans the (small) pre-lowered haystacks.
+    """
+
+    def __init__(self, tools):
+        self.tools = tuple(tools)
+        self.categories = tuple(dict.fromkeys(tool.category for tool in self.tools))
+        self._haystacks = {tool: f'{tool.name}\n{tool.description}'.lower() for tool in self.tools}
+        self._sorted = {
+            'popularity': sorted(self.tools, key=lambda t: (-t.popularity, t.name.lower())),
+            'name': sorted(self.tools, key=lambda t: t.name.lower()),
+            'category': sorted(self.tools, key=lambda t: (self.categories.index(t.category), -t.popularity, t.name.lower())),
+        }
+        self._by_category = {
+            (category, order): [tool for tool in tools if tool.category == category]
+            for order, tools in self._sorted.items() for category in self.categories
+        }
+        self.page = lru_cache(maxsize=512)(self._page)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+        if not isinstance(entries, list):
+            raise ValueError(f'{path}: expected a list of tools')
+        return cls(_validate(entry, index, path) for index, entry in enumerate(entries))
+
+    def query(self, category=None, sort='popularity', search=None):
+        if sort not in SORT_ORDERS:
+            raise ValueError(f'unknown sort order {sort!r}')
+        if category:
+            tools = self._by_category.get((category, sort), [])
+        else:
+            tools = self._sorted[sort]
+        if search:
+            needle = search.lower()
+            tools = [tool for tool in tools if needle in self._haystacks[tool]]
+        return tools
+
+    def _page(self, category, sort, search, page, per_page):
+        """Serialized JSON for one page of results; cached, as the catalog never changes."""
+        tools = self.query(category, sort, search)
+        start = (page - 1) * per_page
+        return json.dumps({
+            'items': [tool._asdict() for tool in tools[start:start + per_page]],
+            'total': len(tools),
+            'page': page,
+            'per_page': per_page,
+            'has_next': start + per_page < len(tools),
+        }, ensure_ascii=False)
+
+
+def _validate(entry, index, path):
+    where = f'{path}: tool #{index}'
+    if not isinstance(entry, dict):
+        raise ValueError(f'{where}: expected an object')
+    missing = set(Tool._fields) - entry.keys()
+    if missing:
+        raise ValueError(f'{where}: missing {", ".join(sorted(missing))}')
+    for field in ('name', 'description', 'url', 'category'):
+        if not isinstance(entry[field], str) or not entry[field].strip():
+            raise ValueError(f'{where}: {field} must be a non-empty string')
+    if not entry['url'].startswith(('https://', 'http://')):
+        raise ValueError(f'{where}: url must be http(s)')
+    popularity = entry['popularity']
+    if not isinstance(popularity, int) or isinstance(popularity, bool) or not 1 <= popularity <= MAX_POPULARITY:
+        raise ValueError(f'{where}: popularity must be an integer from 1 to {MAX_POPULARITY}')
+    return Tool(*(entry[field] for field in Tool._fields))